@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # opclasses in index expressions, search lookups
     # ----------------------------
     'rest_framework',
     'drf_spectacular',
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',  # before the middleware that read or change the body
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -135,8 +137,53 @@ AUTH_USER_MODEL = 'core.User'  # sets the default model for user instead of djan
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.RecipeCursorPagination',  # opaque cursors, no COUNT(*)
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 50)),
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',  # same bytes as DRF's JSONRenderer, with orjson when installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }  # forces RestFrameWork to Generate schema using Open API by using drf spectacular
 
+# responses and tokens are only cached in a cache shared by every worker (redis, memcached, the database...),
+# ALLOW_LOCAL_CACHE=1 caches them in the default locmem cache too, right for a single process only
+# conditional GET (ETag, 304) works either way, without a shared cache it reads the user's last write from the database
+CACHES = {  # locmem by default, CACHE_BACKEND/CACHE_LOCATION switch to e.g. the file based cache
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+ALLOW_LOCAL_CACHE = bool(int(os.environ.get('ALLOW_LOCAL_CACHE', 0)))
+
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))  # seconds a per-user api response is cached
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # smaller bodies are sent as they are
+
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))  # seconds a token -> user lookup stays cached
+
+SYNC_RETENTION_DAYS = int(os.environ.get('SYNC_RETENTION_DAYS', 30))  # tombstones kept for delta sync
+SYNC_OVERLAP_SECONDS = 5  # re-send changes this close to the last sync, late commits may carry older timestamps
+
+RECIPE_IMAGE_SIZES = {'thumb': 200, 'medium': 800}  # variant name -> longest side in pixels
+RECIPE_IMAGE_FORMATS = ['webp', 'jpeg']  # webp is skipped when Pillow is built without it
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_MAX_BYTES = int(os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))  # enforced while streaming
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000  # checked from the image header, before decoding
+
+# how the owner checked image view hands the file over: '' streams it from Python, 'x-accel-redirect'
+# lets nginx send it from an internal location aliasing MEDIA_ROOT at MEDIA_ACCEL_PREFIX, 'x-sendfile' apache
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+SCHEMA_FILE = os.environ.get('SCHEMA_FILE', str(BASE_DIR / 'openapi-schema.json'))  # written by build_schema
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,  # to make upload img work
 }
@@ -16,13 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
 from django.conf.urls.static import static  # static url from module
 from django.conf import settings
 
+from core.schema import CachedSchemaView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/schema/', CachedSchemaView.as_view(), name='api-schema'),  # built by manage.py build_schema
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs'),
     # Swagger will serve as the GUI documentation using the schema url above
     path('api/user/', include('user.urls')),
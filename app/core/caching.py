@@ -0,0 +1,32 @@
+"""
+Whether the default cache is shared by every server process
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Tell if entries invalidated by one worker are gone for all of them.
+
+    Cached responses and tokens are only kept then, a process-local cache would keep serving them in
+    the other workers. ALLOW_LOCAL_CACHE allows it where there is a single process, like tests.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS or getattr(settings, 'ALLOW_LOCAL_CACHE', False)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'The default cache is local to each process, response and token caching are off.',
+        hint='Set CACHE_BACKEND to a shared cache like redis or memcached, or ALLOW_LOCAL_CACHE=1 '
+             'for a single process.',
+        id='core.W001',
+    )]
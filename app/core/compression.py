@@ -0,0 +1,134 @@
+"""
+Response compression with gzip, and brotli or zstd when they are installed
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # optional, like zstandard
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/vnd.oai.openapi', 'application/x-ndjson', 'text/')
+
+
+def _codings():
+    """Content codings this server can produce -> compress function, most preferred first."""
+    codings = {}
+    if brotli is not None:
+        codings['br'] = lambda body: brotli.compress(body, quality=5)  # 11 is too slow for dynamic responses
+    if zstandard is not None:
+        codings['zstd'] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+    codings['gzip'] = compress_string
+    return codings
+
+
+CODINGS = _codings()
+
+
+def parse_accept_encoding(header):
+    """{coding: q} of an Accept-Encoding header, lower cased."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0  # malformed, don't use it
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def choose_coding(header, available=None):
+    """Best coding of the available ones for an Accept-Encoding header, None for identity.
+
+    The client's q values win, ties go to the server's order of preference.
+    """
+    available = list(CODINGS if available is None else available)
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compressed_cache_key(response, coding):
+    """Key of the cached compressed body of a response marked by the response cache, or None."""
+    key = getattr(response, 'cache_key', None)  # set by recipe.cache.cached_response
+    return f'{key}:{coding}' if key else None
+
+
+def compress_body(response, coding):
+    """Compressed body of a response, reused from the response cache when it was compressed before."""
+    key = compressed_cache_key(response, coding)
+    body = cache.get(key) if key else None
+    if body is None:
+        body = CODINGS[coding](response.content)
+        if key:
+            cache.set(key, body, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+    return body
+
+
+class CompressionMiddleware:
+    """Compress JSON and text responses with the best coding the client accepts.
+
+    Responses under COMPRESSION_MIN_SIZE bytes are sent as they are, streaming responses like
+    exports are compressed with gzip only.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+
+        patch_vary_headers(response, ['Accept-Encoding'])  # caches must keep a copy per coding
+        header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if response.streaming:
+            coding = choose_coding(header, ['gzip'])  # one compressor over the whole stream
+            if coding is None:
+                return response
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            coding = choose_coding(header)
+            if coding is None:
+                return response
+            body = compress_body(response, coding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):  # another representation of the same content
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    def _compressible(self, response):
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if response.status_code != 200 or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False  # 206 ranges would no longer match the body, images are compressed already
+        if response.streaming:
+            return not response.is_async
+        return len(response.content) >= self.min_size
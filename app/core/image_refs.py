@@ -0,0 +1,57 @@
+"""
+Reference counts of the content addressed recipe images, a file is deleted with its variants once no recipe uses it
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import StoredImage
+from .storage import image_storage, variant_names
+
+
+def retain_image(name):
+    """Count one more recipe using the image.
+
+    Called before the file is written: the row stays locked until the caller commits, so a
+    concurrent collector either removed the file before (and it's written again) or skips it.
+    """
+    with transaction.atomic():
+        if StoredImage.objects.filter(name=name).update(refs=F('refs') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredImage.objects.create(name=name, refs=1)
+        except IntegrityError:  # a concurrent upload of the same bytes created it first
+            StoredImage.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release_image(name):
+    """Count one recipe less using the image, collecting it after the commit when it was the last one."""
+    StoredImage.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+    transaction.on_commit(lambda: collect_image(name))
+
+
+def release_images(names):
+    """release_image for many images at once, one UPDATE per distinct number of uses released."""
+    counts = Counter(name for name in names if name)
+    by_count = defaultdict(list)  # recipes sharing an image release it several times
+    for name, count in counts.items():
+        by_count[count].append(name)
+    for count, group in by_count.items():
+        StoredImage.objects.filter(name__in=group, refs__gt=0).update(refs=Greatest(F('refs') - count, 0))
+    transaction.on_commit(lambda: [collect_image(name) for name in counts])
+
+
+def collect_image(name):
+    """Delete the image file and its variants if no recipe uses it, returns whether it was deleted."""
+    with transaction.atomic():
+        stored = StoredImage.objects.select_for_update(skip_locked=True).filter(name=name, refs=0).first()
+        if stored is None:  # still used, or being retained right now
+            return False
+        for variant in variant_names(name):
+            image_storage.delete(variant)
+        image_storage.delete(name)
+        stored.delete()
+    return True
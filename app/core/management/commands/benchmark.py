@@ -0,0 +1,156 @@
+#  django command to benchmark the recipe API hot paths on a seeded dataset
+"""
+Seeds users x recipes x tags x ingredients, calls every endpoint in-process and reports
+the latency percentiles and query count of each one as JSON, e.g.:
+
+    python manage.py benchmark --recipes 5000 --iterations 200 --output bench.json
+
+Every scenario is timed cold, with the user's cached responses invalidated before each call, and
+warm under "warm", where reads are answered by the response cache.
+
+The seeded rows are rolled back at the end unless --keep is passed.
+"""
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from core.seeding import seed_recipes
+from recipe.cache import invalidate_user_responses
+
+
+def percentile(cuts, p):
+    """Return the p-th percentile from the 99 cut points of statistics.quantiles."""
+    return round(cuts[p - 1] * 1000, 3)  # seconds to milliseconds
+
+
+def summarize(timings, queries, status_code):
+    """Latency percentiles in ms and the query count of one scenario."""
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'runs': len(timings),
+        'status': status_code,
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': percentile(cuts, 50),
+        'p95_ms': percentile(cuts, 95),
+        'p99_ms': percentile(cuts, 99),
+        'queries': int(statistics.median(queries)),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Seed a dataset and report p50/p95/p99 latency and query count of the recipe API as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2)
+        parser.add_argument('--recipes', type=int, default=500, help='recipes per user')
+        parser.add_argument('--tags', type=int, default=50, help='tags per user')
+        parser.add_argument('--ingredients', type=int, default=200, help='ingredients per user')
+        parser.add_argument('--iterations', type=int, default=50, help='timed calls per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='untimed calls per endpoint')
+        parser.add_argument('--only', nargs='*', help='run only these scenarios')
+        parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='keep the seeded data')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        with transaction.atomic():
+            report = self.run(options)
+            if not options['keep']:
+                transaction.set_rollback(True)  # leave the database as it was
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(body + '\n')
+        else:
+            self.stdout.write(body)
+
+    def run(self, options):
+        """Seed the data and time every scenario."""
+        prefix = f'bench{int(time.time() * 1000)}-'  # unique emails so --keep runs don't collide
+        user = seed_recipes(
+            users=options['users'], recipes=options['recipes'], tags=options['tags'],
+            ingredients=options['ingredients'], prefix=prefix,
+        )[0]
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')  # real auth, part of every request cost
+
+        results = {}
+        for name, call in self.scenarios(user, prefix).items():
+            if options['only'] and name not in options['only']:
+                continue
+            for i in range(options['warmup']):
+                call(client, i)
+            results[name] = self.measure(client, call, user, options, cold=True)
+            results[name]['warm'] = self.measure(client, call, user, options, cold=False)
+
+        return {
+            'database': connection.vendor,
+            'dataset': {key: options[key] for key in ('users', 'recipes', 'tags', 'ingredients')},
+            'iterations': options['iterations'],
+            'results': results,
+        }
+
+    def measure(self, client, call, user, options, cold):
+        """Time the iterations of a scenario, cold ones start without the user's cached responses."""
+        timings, queries = [], []
+        for i in range(options['iterations']):
+            if cold:
+                invalidate_user_responses(user)  # the query path, not a response cached by the last call
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                res = call(client, options['warmup'] + i)
+                timings.append(time.perf_counter() - start)
+            queries.append(len(ctx.captured_queries))
+        return summarize(timings, queries, res.status_code)
+
+    def scenarios(self, user, prefix):
+        """Map scenario names to callables doing one request with the client."""
+        recipes_url = reverse('recipe:recipe-list')
+        recipe_ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True)[:100])
+        tag_ids = ','.join(str(i) for i in Tag.objects.filter(user=user).values_list('id', flat=True)[:3])
+        ingredient_ids = ','.join(
+            str(i) for i in Ingredient.objects.filter(user=user).values_list('id', flat=True)[:3]
+        )
+        tag_names = list(Tag.objects.filter(user=user).values_list('name', flat=True)[:3])
+
+        def recipe_detail(client, i):
+            return client.get(reverse('recipe:recipe-detail', args=[recipe_ids[i % len(recipe_ids)]]))
+
+        def recipe_create(client, i):
+            payload = {
+                'title': f'bench recipe {i}',
+                'time_minutes': 10,
+                'price': '4.50',
+                'tags': [{'name': name} for name in tag_names] + [{'name': f'new tag {i}'}],
+                'ingredients': [{'name': f'new ingredient {i}'}],
+            }
+            return client.post(recipes_url, payload, format='json')
+
+        def token_login(client, i):
+            payload = {'email': user.email, 'password': 'bench-pass123'}
+            return APIClient().post(reverse('user:token'), payload)  # unauthenticated like a real login
+
+        return {
+            'recipe_list': lambda client, i: client.get(recipes_url),
+            'recipe_detail': recipe_detail,
+            'recipe_filter_tags': lambda client, i: client.get(recipes_url, {'tags': tag_ids}),
+            'recipe_filter_ingredients': lambda client, i: client.get(recipes_url, {'ingredients': ingredient_ids}),
+            'recipe_filter_tags_all': lambda client, i: client.get(recipes_url, {'tags': tag_ids, 'match': 'all'}),
+            'recipe_search': lambda client, i: client.get(recipes_url, {'search': f'recipe {i % 100} ingredient'}),
+            'recipe_create': recipe_create,
+            'tags_assigned_only': lambda client, i: client.get(reverse('recipe:tag-list'), {'assigned_only': 1}),
+            'ingredient_autocomplete': lambda client, i: client.get(
+                reverse('recipe:ingredient-autocomplete'), {'prefix': f'ingredient {i % 20}'}),
+            'token_login': token_login,
+        }
@@ -0,0 +1,82 @@
+#  django command to compare the recipe serializers and JSON renderers
+"""
+Seeds a user with recipes, serializes all of them with the model serializer and the .values() row
+serializer and renders the result with DRF's JSONRenderer and FastJSONRenderer, e.g.:
+
+    python manage.py benchmark_serializers --recipes 10000
+
+All outputs must be identical bytes. The seeded rows are rolled back at the end.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe
+from core.renderers import FastJSONRenderer, orjson
+from core.seeding import seed_recipes
+from recipe.queries import ingredients_prefetch, tags_prefetch
+from recipe.rows import RecipeRowSerializer
+from recipe.serializers import RecipeSerializer
+
+
+def best_of(runs, func):
+    """Smallest wall time of func over the runs in ms, and its last result."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings) * 1000, 3), result
+
+
+class Command(BaseCommand):
+    help = 'Time RecipeSerializer against the row serializer on seeded recipes and report JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=3, help='timed runs per serializer, the best is kept')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        with transaction.atomic():
+            user = seed_recipes(recipes=options['recipes'], tags=50, ingredients=200,
+                                prefix=f'serializers{int(time.time() * 1000)}-')[0]
+            recipes = Recipe.objects.filter(user=user).order_by('-id')
+            renderer = JSONRenderer()
+
+            def model_serializer():
+                queryset = recipes.prefetch_related(tags_prefetch(), ingredients_prefetch())
+                return renderer.render(RecipeSerializer(queryset, many=True).data)
+
+            def row_serializer():
+                rows = RecipeRowSerializer(RecipeSerializer)
+                return renderer.render(rows.serialize(list(rows.rows(recipes))))
+
+            model_ms, expected = best_of(options['runs'], model_serializer)
+            rows_ms, output = best_of(options['runs'], row_serializer)
+            if output != expected:
+                raise CommandError('row serializer output differs from RecipeSerializer')
+
+            rows = RecipeRowSerializer(RecipeSerializer)
+            data = rows.serialize(list(rows.rows(recipes)))
+            stdlib_ms, expected = best_of(options['runs'], lambda: renderer.render(data))
+            fast_ms, output = best_of(options['runs'], lambda: FastJSONRenderer().render(data))
+            if output != expected:
+                raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+            transaction.set_rollback(True)  # leave the database as it was
+
+        report = {
+            'recipes': options['recipes'],
+            'model_serializer_ms': model_ms,
+            'row_serializer_ms': rows_ms,
+            'speedup': round(model_ms / rows_ms, 2) if rows_ms else None,
+            'json_encoder': 'orjson' if orjson else 'json',
+            'json_renderer_ms': stdlib_ms,
+            'fast_json_renderer_ms': fast_ms,
+            'render_speedup': round(stdlib_ms / fast_ms, 2) if fast_ms else None,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
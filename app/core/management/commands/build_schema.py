@@ -0,0 +1,25 @@
+#  django command to generate the OpenAPI schema at build time
+"""
+Writes the schema served at api/schema/ to SCHEMA_FILE so servers don't introspect the views, e.g.:
+
+    python manage.py build_schema
+
+Run it again whenever the API changes, a stale file is served as it is.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema into SCHEMA_FILE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='write here instead of SCHEMA_FILE')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        path = options['file'] or settings.SCHEMA_FILE
+        size = write_schema(path)
+        self.stdout.write(self.style.SUCCESS(f'wrote {size} bytes to {path}'))
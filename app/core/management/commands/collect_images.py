@@ -0,0 +1,61 @@
+#  django command to delete recipe image files no recipe uses
+"""
+Collects images whose reference count dropped to zero without being deleted (e.g. a crash
+before the commit hook ran), then files nothing references at all, like the orphans left
+before images were counted. Untracked files younger than --grace minutes are kept, they
+may belong to an upload that hasn't committed yet.
+"""
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.image_refs import collect_image
+from core.models import StoredImage
+from core.storage import IMAGE_DIR, VARIANT_DIR, image_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe images and variants no recipe uses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60, help='minutes untracked files are kept')
+        parser.add_argument('--dry-run', action='store_true', help='only report what would be deleted')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        unused = StoredImage.objects.filter(refs=0).values_list('name', flat=True)
+        if options['dry_run']:
+            collected = unused.count()
+        else:
+            collected = sum(collect_image(name) for name in list(unused))
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace'])
+        stems = {
+            os.path.splitext(os.path.basename(name))[0]
+            for name in StoredImage.objects.values_list('name', flat=True).iterator()
+        }
+        orphans = [
+            name for name in self.files(IMAGE_DIR) + self.files(VARIANT_DIR)
+            if self.stem(name) not in stems and image_storage.get_modified_time(name) < cutoff
+        ]
+        if not options['dry_run']:
+            for name in orphans:
+                image_storage.delete(name)
+
+        verb = 'would be removed' if options['dry_run'] else 'removed'
+        self.stdout.write(self.style.SUCCESS(f'{collected} unused images and {len(orphans)} orphan files {verb}'))
+
+    def files(self, directory):
+        """Names of the files directly in a storage directory, none when it doesn't exist."""
+        if not image_storage.exists(directory):
+            return []
+        return [os.path.join(directory, name) for name in image_storage.listdir(directory)[1]]
+
+    def stem(self, name):
+        """Stem of the source image a stored or variant file belongs to."""
+        stem = os.path.splitext(os.path.basename(name))[0]
+        if os.path.dirname(name) == VARIANT_DIR:
+            stem = stem.rsplit('-', 1)[0]  # drop the size label
+        return stem
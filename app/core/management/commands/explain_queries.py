@@ -0,0 +1,78 @@
+#  django command to print the database plans of the recipe API hot queries
+"""
+Run it before and after the index migration to compare the plans, e.g.:
+
+    python manage.py migrate core 0006 && python manage.py explain_queries --seed-recipes 50000
+    python manage.py migrate && python manage.py explain_queries --email bench0@example.com
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Recipe, Tag, Ingredient
+from core.search import search_recipes
+from core.seeding import seed_recipes
+from recipe.queries import MATCH_ALL, assigned, filter_by_related, usage_count
+
+PAGE = 50
+
+
+def uses_index(plan):
+    """Tell if a plan reads the table through an index (postgres and sqlite wording)."""
+    return any(word in plan for word in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'USING INDEX',
+                                         'USING COVERING INDEX'))
+
+
+class Command(BaseCommand):
+    help = 'Print the plans of the recipe API hot queries and whether they use an index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='explain the queries for this existing user')
+        parser.add_argument('--seed-recipes', type=int, default=0, help='seed a user with this many recipes first')
+        parser.add_argument('--seed-tags', type=int, default=2000)
+        parser.add_argument('--analyze', action='store_true', help='run the queries to show real timings')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        if options['seed_recipes']:
+            prefix = f'explain{get_user_model().objects.count()}-'  # new prefix so repeated runs don't collide
+            user = seed_recipes(
+                recipes=options['seed_recipes'], tags=options['seed_tags'], ingredients=options['seed_tags'],
+                prefix=prefix,
+            )[0]
+        elif options['email']:
+            user = get_user_model().objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f"no user with email {options['email']}")
+        else:
+            raise CommandError('pass --email or --seed-recipes')
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:  # fresh statistics so the planner sees the seeded rows
+                cursor.execute('ANALYZE core_recipe, core_tag, core_ingredient')
+
+        names = [f'tag {i}' for i in range(5)]
+        tag_ids = list(Tag.objects.filter(user=user, name__in=names[:3]).values_list('id', flat=True))
+        recipes = Recipe.objects.filter(user=user).order_by('-id')
+        tags = Tag.objects.filter(user=user).order_by('-name')
+        queries = {
+            'recipe_list': Recipe.objects.filter(user=user).order_by('-id')[:PAGE],
+            'recipe_filter_tags_join': recipes.filter(tags__id__in=tag_ids).distinct()[:PAGE],  # before match=
+            'recipe_filter_tags_any': filter_by_related(recipes, 'tags', tag_ids)[:PAGE],
+            'recipe_filter_tags_all': filter_by_related(recipes, 'tags', tag_ids, MATCH_ALL)[:PAGE],
+            'recipe_search': search_recipes(Recipe.objects.filter(user=user), 'recipe 7').order_by('-id')[:PAGE],
+            'tag_list': Tag.objects.filter(user=user).order_by('-name')[:PAGE],
+            'tag_assigned_join': tags.filter(recipe__isnull=False).distinct()[:PAGE],  # before EXISTS
+            'tag_assigned_exists': tags.filter(assigned(Tag))[:PAGE],
+            'tag_usage_count': tags.annotate(usage_count=usage_count(Tag))[:PAGE],
+            'ingredient_list': Ingredient.objects.filter(user=user).order_by('-name')[:PAGE],
+            'tag_lookup': Tag.objects.filter(user=user, name__in=names),
+            'ingredient_lookup': Ingredient.objects.filter(user=user, name__in=names),
+            'ingredient_autocomplete': Ingredient.objects.filter(user=user, name__istartswith='ingredient 1')[:PAGE],
+        }
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        for name, queryset in queries.items():
+            plan = queryset.explain(**explain_options)
+            scan = 'index scan' if uses_index(plan) else 'seq scan'
+            self.stdout.write(self.style.SUCCESS(f'{name}: {scan}'))
+            self.stdout.write(plan + '\n')
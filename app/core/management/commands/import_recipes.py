@@ -0,0 +1,125 @@
+#  django command to bulk import recipes from NDJSON or CSV
+"""
+Reads the file as a stream, validates it in chunks, resolves tag and ingredient names
+against an in-memory dictionary of the user's names and writes each chunk with a few
+bulk inserts in one transaction. Progress is committed with every chunk, running the
+same command again after a failure resumes after the last committed chunk.
+
+The input matches the export of the API (recipes/export/), e.g.:
+
+    python manage.py import_recipes recipes.ndjson --email user@example.com
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import ImportJob, Tag, Ingredient
+from recipe.bulk import NameResolver, create_recipes
+from recipe.cache import invalidate_user_responses
+from recipe.serializers import RecipeImportSerializer
+
+
+def _names(value):
+    """Tag or ingredient names from a CSV cell ('a|b') or an exported list of names or objects."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [name for name in value.split('|') if name]
+    return [item['name'] if isinstance(item, dict) else item for item in value]
+
+
+def read_rows(fh, input_format):
+    """Yield the rows of the file one at a time, an error message in place of a line that isn't a JSON object."""
+    if input_format == 'csv':
+        yield from csv.DictReader(fh)
+        return
+    for line in fh:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield f'Invalid JSON: {exc}'
+            continue
+        yield row if isinstance(row, dict) else 'Expected a JSON object.'
+
+
+class Command(BaseCommand):
+    help = 'Bulk import recipes from NDJSON or CSV for a user, resumable after a failure.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON or CSV file, like the ones from recipes/export/')
+        parser.add_argument('--email', required=True, help='owner of the imported recipes')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--job', help='name to track the progress with, defaults to the file name')
+        parser.add_argument('--restart', action='store_true', help='import from the start again')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"no user with email {options['email']}")
+        path = options['path']
+        input_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+
+        job, _ = ImportJob.objects.get_or_create(user=user, name=options['job'] or os.path.basename(path))
+        if options['restart']:
+            job.rows_done, job.finished = 0, False
+            job.save()
+        elif job.finished:
+            raise CommandError(f'{job.name} was imported already, pass --restart to import it again')
+        if job.rows_done:
+            self.stdout.write(f'resuming {job.name} after row {job.rows_done}')
+
+        tag_resolver = NameResolver(Tag, user, preload=True)
+        ingredient_resolver = NameResolver(Ingredient, user, preload=True)
+        imported = invalid = 0
+        started = time.perf_counter()
+
+        with open(path, newline='', encoding='utf-8') as fh:
+            rows = enumerate(read_rows(fh, input_format), start=1)  # row numbers for errors and progress
+            for _ in islice(rows, job.rows_done):  # rows committed by an earlier run
+                pass
+            while chunk := list(islice(rows, options['chunk_size'])):
+                valid = []
+                for number, row in chunk:
+                    if isinstance(row, str):  # skipped like invalid rows, or resuming would stop at it again
+                        invalid += 1
+                        self.stderr.write(f'row {number}: {json.dumps({"row": [row]})}')
+                        continue
+                    row['tags'], row['ingredients'] = _names(row.get('tags')), _names(row.get('ingredients'))
+                    serializer = RecipeImportSerializer(data=row)
+                    if serializer.is_valid():
+                        data = dict(serializer.validated_data)
+                        valid.append({'tags': data.pop('tags'), 'ingredients': data.pop('ingredients'),
+                                      'fields': data})
+                    else:
+                        invalid += 1
+                        self.stderr.write(f'row {number}: {json.dumps(serializer.errors)}')
+
+                with transaction.atomic():  # the chunk and its progress are committed together
+                    create_recipes(user, valid, tag_resolver, ingredient_resolver)
+                    job.rows_done = chunk[-1][0]
+                    job.save(update_fields=['rows_done', 'updated_at'])
+                if valid:
+                    invalidate_user_responses(user)  # committed, cached lists of the user are stale now
+
+                imported += len(valid)
+                rate = imported / (time.perf_counter() - started)
+                self.stdout.write(f'{job.rows_done} rows done, {imported} imported ({rate:.0f} rows/s)')
+
+        job.finished = True
+        job.save(update_fields=['finished', 'updated_at'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'imported {imported} recipes, {invalid} invalid rows skipped in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
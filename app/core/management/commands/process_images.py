@@ -0,0 +1,52 @@
+#  django command running the worker pool that generates recipe image variants
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipe.images import claim_job, process_job
+
+
+class Command(BaseCommand):
+    help = 'Generate resized variants of uploaded recipe images from the database job queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='threads taking jobs concurrently')
+        parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        if options['workers'] == 1:
+            processed = self.work(options)
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:  # Pillow releases the GIL while resizing
+                futures = [pool.submit(self.threaded_work, options) for _ in range(options['workers'])]
+                processed = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} image jobs processed'))
+
+    def threaded_work(self, options):
+        try:
+            return self.work(options)
+        finally:
+            connection.close()  # every thread opened its own database connection
+
+    def work(self, options):
+        """Take and process jobs until the queue is empty with --once, forever otherwise."""
+        processed = 0
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return processed
+                time.sleep(options['sleep'])
+                continue
+            try:
+                job = process_job(job)
+            except Exception as exc:  # noqa  # the job is taken again once stale, the worker goes on
+                self.stderr.write(f'{job.source}: {exc!r}')
+                continue
+            processed += 1
+            self.stdout.write(f'{job.source}: {job.status}')
@@ -0,0 +1,18 @@
+#  django command to remove tombstones older than the sync retention
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Deletion
+
+
+class Command(BaseCommand):
+    help = 'Delete tombstones older than SYNC_RETENTION_DAYS, clients older than that resync fully.'
+
+    def handle(self, *args, **options):
+        # Entrypoint for command
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS)
+        deleted, _ = Deletion.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstones removed'))
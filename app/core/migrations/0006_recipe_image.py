@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:34
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ingredient_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, upload_to=core.models.recipe_image_file_path),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:34
+
+from django.db import migrations, models
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients sharing a name for the same user before making the name unique."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        target = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(keep_id=models.Min('id'), total=models.Count('id'))
+            .filter(total__gt=1)
+        )
+        for dup in duplicates:
+            extra_ids = list(
+                model.objects.filter(user_id=dup['user_id'], name=dup['name'])
+                .exclude(id=dup['keep_id']).values_list('id', flat=True)
+            )
+            linked = set(through.objects.filter(**{f'{target}__in': extra_ids}).values_list('recipe_id', flat=True))
+            through.objects.bulk_create(
+                [through(**{'recipe_id': recipe_id, target: dup['keep_id']}) for recipe_id in linked],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=extra_ids).delete()  # cascades to their through rows
+    if schema_editor.connection.vendor == 'postgresql':
+        # run the deferred FK checks of the deletes now, ALTER TABLE refuses tables with pending trigger events
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:00
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+def count_stored_images(apps, schema_editor):
+    """Count the recipes using every existing image, so they are collected like the new ones."""
+    Recipe = apps.get_model('core', 'Recipe')
+    StoredImage = apps.get_model('core', 'StoredImage')
+    used = (
+        Recipe.objects.exclude(image__isnull=True).exclude(image='')
+        .values('image').annotate(refs=models.Count('id'))
+    )
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=row['image'], refs=row['refs']) for row in used.iterator()], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_image_variants_imagejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='imagejob',
+            name='obsolete',
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=core.models.RecipeImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(count_stored_images, migrations.RunPython.noop),
+    ]
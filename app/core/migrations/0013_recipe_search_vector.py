@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:07
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx')
+
+
+def add_search_index(apps, schema_editor):
+    """GIN indexes are postgres only, other databases search without the stored vectors."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('core', 'Recipe'), SEARCH_INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('core', 'Recipe'), SEARCH_INDEX)
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Compute the vectors of the existing recipes, like core.search.update_search_vectors."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('core', 'Recipe')
+    through = Recipe._meta.get_field('ingredients').remote_field.through
+    ingredient_names = Subquery(
+        through.objects.filter(recipe_id=OuterRef('pk')).values('recipe_id')
+        .annotate(names=StringAgg('ingredient__name', ' ')).values('names')
+    )
+    Recipe.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='english')
+        + SearchVector(Coalesce(ingredient_names, Value(''), output_field=TextField()), weight='B', config='english')
+        + SearchVector('description', weight='C', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='recipe', index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_search_index, remove_search_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:14
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+
+
+def prefix_index(name):
+    return models.Index(models.F('user'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('name', models.TextField())), name='text_pattern_ops'), name=name)  # noqa
+
+
+PREFIX_INDEXES = [('ingredient', prefix_index('ingredient_name_prefix_idx')), ('tag', prefix_index('tag_name_prefix_idx'))]
+
+
+def add_prefix_indexes(apps, schema_editor):
+    """Operator classes are postgres only, other databases run the prefix lookups without these indexes."""
+    if schema_editor.connection.vendor == 'postgresql':
+        for model_name, index in PREFIX_INDEXES:
+            schema_editor.add_index(apps.get_model('core', model_name), index)
+
+
+def remove_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for model_name, index in PREFIX_INDEXES:
+            schema_editor.remove_index(apps.get_model('core', model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in PREFIX_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_prefix_indexes, remove_prefix_indexes),
+            ],
+        ),
+    ]
@@ -1,17 +1,63 @@
-import uuid
 import os
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Cast, Upper
+from django.db.models.fields.files import ImageFieldFile
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 
+from .storage import IMAGE_DIR, content_hash, image_storage
+
 
 def recipe_image_file_path(instance, filename):
-    """Generate file path for new recipe images."""
-    ext = os.path.splitext(filename)[1]  # splits the root and extension
-    filename = f'{uuid.uuid4()}{ext}'  # generates a random filename attach it to extension
+    """Generate file path for new recipe images, RecipeImageFieldFile names them by the hash of their bytes."""
+    filename = os.path.basename(filename)
+
+    return os.path.join(IMAGE_DIR, filename)  # instead of creating str, this ensures URL is correct to the OS
+
+
+class RecipeImageFieldFile(ImageFieldFile):
+    """Recipe image stored once per content and counted per recipe using it, see core.image_refs"""
+
+    def save(self, name, content, save=True):
+        from .image_refs import release_image, retain_image  # image_refs needs the models
+        replaced = self.name if self._committed else None  # saving over a stored image replaces it
+        ext = os.path.splitext(name)[1].lower()
+        name = f'{content_hash(content)}{ext}'  # equal images get the same name and are stored once
+        retain_image(self.field.generate_filename(self.instance, name))  # before the file is written
+        super().save(name, content, save)
+        if replaced:
+            release_image(replaced)
+
+    def delete(self, save=True):
+        """Drop the image from the recipe, the file goes once no recipe uses it."""
+        from .image_refs import release_image
+        if not self:
+            return
+        name = self.name
+        if hasattr(self, '_file'):
+            self.close()
+            del self.file
+        self.name = None
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = False
+        if save:
+            self.instance.save()
+        release_image(name)
+
+
+class RecipeImageField(models.ImageField):
+    """Image field of recipes, content addressed and reference counted"""
+    attr_class = RecipeImageFieldFile
+
 
-    return os.path.join('uploads', 'recipe', filename)  # instead of creating str, this ensures URL is correct to the OS
+def name_prefix_index(name):
+    """Index for case-insensitive name prefix lookups per user, like istartswith does them on postgres."""
+    # the default collation can't serve LIKE 'x%', text_pattern_ops compares characters and can
+    return models.Index(F('user'), OpClass(Upper(Cast('name', models.TextField())), name='text_pattern_ops'), name=name)
 
 
 class UserManager(BaseUserManager):
@@ -56,7 +102,17 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField("Tag", blank=True)
     ingredients = models.ManyToManyField("Ingredient", blank=True)
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = RecipeImageField(null=True, upload_to=recipe_image_file_path, storage=image_storage)
+    image_variants = models.JSONField(default=dict, blank=True)  # {size: {format: file name}} made by the worker
+    updated_at = models.DateTimeField(auto_now=True)  # changes on every save, used by clients to validate caches
+    search_vector = SearchVectorField(null=True, editable=False)  # kept current by core.signals
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),  # user's recipes newest first
+            models.Index(fields=['user', 'updated_at'], name='recipe_user_updated_idx'),  # changes since a sync
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),  # ?search= matches
+        ]
 
     def __str__(self):
         return self.title
@@ -66,6 +122,16 @@ class Tag(models.Model):
     """Tags for filtering recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [  # the unique index on (user, name) also serves name lookups and ordering per user
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_tag_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='tag_user_updated_idx'),
+            name_prefix_index('tag_name_prefix_idx'),  # autocomplete
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +141,89 @@ class Ingredient(models.Model):
     """Ingredient for recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [  # the unique index on (user, name) also serves name lookups and ordering per user
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_ingredient_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='ingredient_user_updated_idx'),
+            name_prefix_index('ingredient_name_prefix_idx'),  # autocomplete
+        ]
 
     def __str__(self):
         return self.name
+
+
+class Deletion(models.Model):
+    """Tombstone of a deleted recipe, tag or ingredient so syncing clients can drop it too"""
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = [(RECIPE, 'Recipe'), (TAG, 'Tag'), (INGREDIENT, 'Ingredient')]
+
+    user_id = models.BigIntegerField()  # no foreign key, deleting a user mustn't fail on its own tombstones
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at'], name='deletion_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class ImportJob(models.Model):
+    """Progress of a recipe import, so a failed import resumes after the last committed chunk"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    rows_done = models.PositiveBigIntegerField(default=0)  # input rows committed, valid or skipped as invalid
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_import_job_per_user'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ImageJob(models.Model):
+    """Queued generation of the resized variants of a recipe image, run by the process_images worker"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    source = models.CharField(max_length=255)  # image file the variants are made from
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='imagejob_status_idx'),  # workers take the oldest pending
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class StoredImage(models.Model):
+    """A content addressed image file and how many recipes use it, the file is collected once none do"""
+    name = models.CharField(max_length=255, unique=True)  # storage name, the hash of the bytes
+    refs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
@@ -0,0 +1,24 @@
+"""
+JSON parser decoding with orjson when it is installed
+"""
+import io
+
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """Parse JSON request bodies like DRF's JSONParser, with orjson for UTF-8 bodies."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('_', '-') != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)  # rejects NaN and Infinity like the strict stdlib parser
+        except orjson.JSONDecodeError:  # the stdlib raises the usual ParseError, or reads what orjson can't
+            return super().parse(io.BytesIO(body), media_type, parser_context)
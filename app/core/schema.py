@@ -0,0 +1,79 @@
+"""
+OpenAPI schema generated once, by the build_schema command or on the first request
+"""
+import functools
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+def generate_schema():
+    """Introspect every view and serializer into the schema dict, slow."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def write_schema(path):
+    """Generate the schema and write it to path as JSON, replacing the old file at once."""
+    body = OpenApiJsonRenderer().render(generate_schema(), renderer_context={})
+    tmp = f'{path}.part'
+    with open(tmp, 'wb') as fh:
+        fh.write(body)
+    os.replace(tmp, path)  # a running server never reads half a file
+    clear_schema_cache()
+    return len(body)
+
+
+@functools.lru_cache(maxsize=None)
+def load_schema():
+    """The schema from SCHEMA_FILE, or generated once per process when the file wasn't built."""
+    path = getattr(settings, 'SCHEMA_FILE', None)
+    if path and os.path.exists(path):
+        with open(path, 'rb') as fh:
+            return json.loads(fh.read())
+    return generate_schema()
+
+
+@functools.lru_cache(maxsize=None)
+def rendered_schema(renderer_class):
+    """Body of the schema in a renderer's format and its sha256, rendered once per format."""
+    body = renderer_class().render(load_schema(), renderer_context={})
+    return body, hashlib.sha256(body).hexdigest()
+
+
+def clear_schema_cache():
+    load_schema.cache_clear()
+    rendered_schema.cache_clear()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    # SpectacularAPIView serving the schema built once, with an ETag to revalidate it
+    __doc__ = SpectacularAPIView.__doc__  # the description of the endpoint in the schema
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if set(request.query_params) - {'format'} or self.custom_settings or self.patterns or self.api_version:
+            return super().get(request, *args, **kwargs)  # ?lang=, ?version=... are generated as before
+
+        renderer = request.accepted_renderer
+        body, digest = rendered_schema(type(renderer))
+        etag = quote_etag(digest)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content_type = f'{request.accepted_media_type}; charset={renderer.charset}' if renderer.charset \
+                else request.accepted_media_type
+            response = HttpResponse(body, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+            response.cache_key = f'schema:{digest}'  # core.compression caches the compressed bodies under it
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)  # revalidated, the ETag makes that a 304
+        return response
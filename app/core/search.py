@@ -0,0 +1,59 @@
+"""
+Full-text search over recipe titles, ingredient names and descriptions
+"""
+from functools import reduce
+from operator import and_
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Recipe
+
+SEARCH_CONFIG = 'english'  # stemming of the stored vectors and of the queries must match
+
+
+def search_enabled():
+    """Stored vectors and their GIN index only exist on postgres, other databases search with LIKE."""
+    return connection.vendor == 'postgresql'
+
+
+def search_document():
+    """Weighted tsvector of a recipe: title first, then ingredient names, then the description."""
+    ingredient_names = Subquery(
+        Recipe.ingredients.through.objects.filter(recipe_id=OuterRef('pk'))
+        .values('recipe_id')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    ingredient_names = Coalesce(ingredient_names, Value(''), output_field=TextField())  # recipes without any
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Recompute the stored search vectors of a recipe queryset with one UPDATE, call it after writes."""
+    if not search_enabled():
+        return 0
+    return recipes.update(search_vector=search_document())  # update() leaves updated_at alone, no visible change
+
+
+def search_recipes(queryset, terms):
+    """Filter recipes matching the search terms, annotated with their 'rank' on postgres."""
+    if search_enabled():
+        query = SearchQuery(terms, search_type='websearch', config=SEARCH_CONFIG)  # quotes, OR and -word work
+        return queryset.filter(search_vector=query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField()),  # float8 so cursors round-trip
+        )
+    words = terms.split()
+    if not words:
+        return queryset
+    return queryset.filter(reduce(and_, [  # every word somewhere in the recipe
+        Q(title__icontains=word) | Q(description__icontains=word) | Q(ingredients__name__icontains=word)
+        for word in words
+    ])).distinct()  # one row per matching ingredient otherwise
@@ -0,0 +1,66 @@
+"""
+Seed data for benchmarking the recipe APIs
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Recipe, Tag, Ingredient
+from .search import update_search_vectors
+
+BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def seed_recipes(users=1, recipes=100, tags=10, ingredients=20,
+                 tags_per_recipe=3, ingredients_per_recipe=5, prefix='bench', seed=0):
+    """Create users with recipes, tags and ingredients in bulk and return the users"""
+    rnd = random.Random(seed)  # same seed gives the same dataset so runs can be compared
+    created = []
+    for u in range(users):
+        user = get_user_model().objects.create_user(
+            email=f'{prefix}{u}@example.com',
+            password='bench-pass123',
+            name=f'{prefix} user {u}',
+        )
+        created.append(user)
+
+        tag_objs = Tag.objects.bulk_create(
+            [Tag(user=user, name=f'tag {i}') for i in range(tags)], batch_size=BATCH_SIZE,
+        )
+        ingredient_objs = Ingredient.objects.bulk_create(
+            [Ingredient(user=user, name=f'ingredient {i}') for i in range(ingredients)], batch_size=BATCH_SIZE,
+        )
+        recipe_objs = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user=user,
+                    title=f'recipe {i}',
+                    description=f'description of recipe {i}',
+                    time_minutes=rnd.randint(5, 120),
+                    price=Decimal(rnd.randint(100, 9999)) / 100,
+                )
+                for i in range(recipes)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        _link(Recipe.tags.through, 'tag_id', recipe_objs, tag_objs, tags_per_recipe, rnd)
+        _link(Recipe.ingredients.through, 'ingredient_id', recipe_objs, ingredient_objs, ingredients_per_recipe, rnd)
+        update_search_vectors(Recipe.objects.filter(user=user))  # one UPDATE for all of the user's recipes
+
+    return created
+
+
+def _link(through, target, recipes, objs, per_recipe, rnd):
+    """Attach a random sample of objs to every recipe through the M2M table"""
+    per_recipe = min(per_recipe, len(objs))
+    through.objects.bulk_create(
+        [
+            through(**{'recipe_id': recipe.id, target: obj.id})
+            for recipe in recipes
+            for obj in rnd.sample(objs, per_recipe)
+        ],
+        batch_size=BATCH_SIZE,
+    )
@@ -0,0 +1,105 @@
+"""
+Signals recording tombstones of deleted recipes, tags and ingredients, counting image references
+and keeping the search vectors of recipes current
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .image_refs import release_image
+from .models import Deletion, Recipe, Tag, Ingredient
+from .search import update_search_vectors
+
+KINDS = {Recipe: Deletion.RECIPE, Tag: Deletion.TAG, Ingredient: Deletion.INGREDIENT}
+SEARCHED_FIELDS = {'title', 'description'}  # of the recipe, its ingredient names are searched too
+
+_bulk_deleting = ContextVar('bulk_deleting', default=False)
+
+
+@contextmanager
+def bulk_deletion():
+    """Skip the per-object tombstones and image releases of deletes, the caller does them in bulk."""
+    token = _bulk_deleting.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deleting.reset(token)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_deletion(sender, instance, **kwargs):
+    """Keep a tombstone so the delete reaches clients syncing changes."""
+    if _bulk_deleting.get():
+        return
+    Deletion.objects.create(user_id=instance.user_id, kind=KINDS[sender], object_id=instance.id)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_replaced_image(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored image a newly assigned one replaces, the new one is counted when its file is saved."""
+    if 'image' in instance.get_deferred_fields() or (update_fields is not None and 'image' not in update_fields):
+        return  # no new file can be written by this save
+    image = instance.image
+    if instance.pk and image and not image._committed:
+        instance._replaced_image = Recipe.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    """Release the image a recipe no longer uses."""
+    replaced = instance.__dict__.pop('_replaced_image', None)
+    if replaced:
+        release_image(replaced)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Release the image of a deleted recipe."""
+    if _bulk_deleting.get():
+        return
+    if instance.image:
+        release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, update_fields=None, **kwargs):
+    """Index the title and description of a saved recipe."""
+    if update_fields is None or SEARCHED_FIELDS.intersection(update_fields):
+        update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_ingredients_search_vectors(sender, instance, action, reverse, pk_set, **kwargs):
+    """Index the ingredient names of recipes whose ingredients were added, removed or cleared."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':  # the recipes of the ingredient are gone after the clear
+        instance._cleared_recipe_ids = list(instance.recipe_set.values_list('id', flat=True))
+    elif action == 'post_clear':
+        update_search_vectors(Recipe.objects.filter(id__in=instance.__dict__.pop('_cleared_recipe_ids', [])))
+    elif action in ('post_add', 'post_remove'):
+        update_search_vectors(Recipe.objects.filter(id__in=pk_set))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_renamed_ingredient_search_vectors(sender, instance, created, update_fields=None, **kwargs):
+    """Index the new name of an ingredient in its recipes."""
+    if not created and (update_fields is None or 'name' in update_fields):
+        update_search_vectors(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_ingredient_recipes(sender, instance, **kwargs):
+    """Remember the recipes of a deleted ingredient, its links are deleted with it."""
+    instance._recipe_ids = list(instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Ingredient)
+def update_deleted_ingredient_search_vectors(sender, instance, **kwargs):
+    """Recipes of a deleted ingredient aren't found by its name anymore."""
+    update_search_vectors(Recipe.objects.filter(id__in=instance.__dict__.pop('_recipe_ids', [])))
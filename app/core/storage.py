@@ -0,0 +1,55 @@
+"""
+Content addressed storage of recipe images, the same bytes are stored once whichever recipes use them
+"""
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+IMAGE_DIR = os.path.join('uploads', 'recipe')
+VARIANT_DIR = os.path.join(IMAGE_DIR, 'variants')
+
+
+def content_hash(file):
+    """sha256 hex digest of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():  # starts from the beginning of the file
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_name(source_name, label, fmt):
+    """Name of a resized variant, derived from its source so equal images share their variants."""
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return os.path.join(VARIANT_DIR, f'{stem}-{label}.{fmt}')
+
+
+def variant_names(source_name):
+    """Every variant name a source can have with the configured sizes and formats."""
+    return [
+        variant_name(source_name, label, fmt)
+        for label in settings.RECIPE_IMAGE_SIZES for fmt in settings.RECIPE_IMAGE_FORMATS
+    ]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage where a name stands for its bytes, saving a stored name again writes nothing"""
+
+    def get_available_name(self, name, max_length=None):
+        return name  # the same name means the same bytes, no need for a free one
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # written under a unique name then renamed, readers never see half a file and concurrent
+        # writers of the same name just replace it with the same bytes
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+image_storage = ContentAddressedStorage()
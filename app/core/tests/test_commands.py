@@ -1,12 +1,25 @@
 # test for django management commands
 
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psy2Error
 
-from django.core.management import call_command
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Deletion, ImportJob, Recipe, StoredImage, Tag
+from core.storage import image_storage
 
 
 @patch('core.management.commands.wait_for_db.Command.check')  # mocking the methode of base command check methode
@@ -44,3 +57,208 @@ class CommandTest(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ExplainQueriesCommandTest(TestCase):
+    # test the explain_queries command
+
+    def test_explain_queries_seeded(self):
+        out = StringIO()
+        call_command('explain_queries', seed_recipes=20, seed_tags=10, stdout=out)
+
+        output = out.getvalue()
+        names = ['recipe_list', 'recipe_filter_tags_join', 'recipe_filter_tags_any', 'recipe_filter_tags_all',
+                 'recipe_search', 'tag_list', 'tag_assigned_join', 'tag_assigned_exists', 'tag_usage_count',
+                 'ingredient_list', 'tag_lookup', 'ingredient_lookup', 'ingredient_autocomplete']
+        for name in names:
+            self.assertRegex(output, f'{name}: (index|seq) scan')  # tiny tables may still be read sequentially
+
+
+class BenchmarkCommandTest(TestCase):
+    # test the benchmark command
+
+    def test_benchmark_reports_json(self):
+        out = StringIO()
+        call_command('benchmark', users=1, recipes=5, tags=3, ingredients=3, iterations=2, warmup=0, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset']['recipes'], 5)
+        for name in ['recipe_list', 'recipe_detail', 'recipe_filter_tags', 'recipe_filter_ingredients',
+                     'recipe_create', 'tags_assigned_only', 'token_login']:
+            result = report['results'][name]
+            self.assertEqual(result['runs'], 2)
+            self.assertLess(result['status'], 300)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)  # cold, every call runs its queries
+            self.assertEqual(result['warm']['runs'], 2)
+
+    def test_benchmark_rolls_back_seed(self):
+        call_command('benchmark', users=1, recipes=2, iterations=1, warmup=0, only=['recipe_list'],
+                     stdout=StringIO())
+
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class BenchmarkSerializersCommandTest(TestCase):
+    # test the serializer benchmark command
+
+    def test_benchmark_serializers_reports_json(self):
+        out = StringIO()
+        call_command('benchmark_serializers', recipes=5, runs=1, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['recipes'], 5)
+        self.assertGreater(report['model_serializer_ms'], 0)
+        self.assertFalse(get_user_model().objects.exists())  # seeded rows rolled back
+
+
+class PruneDeletionsCommandTest(TestCase):
+    # test the prune_deletions command
+
+    def test_prune_old_tombstones(self):
+        old = Deletion.objects.create(user_id=1, kind=Deletion.TAG, object_id=1)
+        Deletion.objects.filter(id=old.id).update(deleted_at=timezone.now() - timedelta(days=365))
+        recent = Deletion.objects.create(user_id=1, kind=Deletion.TAG, object_id=2)
+
+        call_command('prune_deletions', stdout=StringIO())
+
+        self.assertEqual(list(Deletion.objects.values_list('id', flat=True)), [recent.id])
+
+
+class CollectImagesCommandTest(TestCase):
+    # test the collect_images command
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, RECIPE_IMAGE_SIZES={'thumb': 20},
+                                                   RECIPE_IMAGE_FORMATS=['jpeg'])
+        self.settings_override.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(self.settings_override.disable)
+
+    def store(self, name, age_minutes=0):
+        image_storage.save(name, ContentFile(b'bytes'))
+        old = time.time() - age_minutes * 60
+        os.utime(image_storage.path(name), (old, old))
+        return name
+
+    def test_collect_unused_and_orphan_files(self):
+        unused = self.store('uploads/recipe/aaa.jpg')
+        unused_variant = self.store('uploads/recipe/variants/aaa-thumb.jpeg')
+        StoredImage.objects.create(name=unused, refs=0)
+        used = self.store('uploads/recipe/bbb.jpg', age_minutes=120)
+        used_variant = self.store('uploads/recipe/variants/bbb-thumb.jpeg', age_minutes=120)
+        StoredImage.objects.create(name=used, refs=1)
+        orphan = self.store('uploads/recipe/0d1a2b3c-old-uuid.jpg', age_minutes=120)
+        orphan_variant = self.store('uploads/recipe/variants/0d1a2b3c-old-uuid-thumb.jpeg', age_minutes=120)
+        recent = self.store('uploads/recipe/ccc.jpg')  # may be an upload not committed yet
+
+        out = StringIO()
+        call_command('collect_images', stdout=out)
+
+        for name in (unused, unused_variant, orphan, orphan_variant):
+            self.assertFalse(image_storage.exists(name), name)
+        for name in (used, used_variant, recent):
+            self.assertTrue(image_storage.exists(name), name)
+        self.assertEqual(list(StoredImage.objects.values_list('name', flat=True)), [used])
+        self.assertIn('1 unused images and 2 orphan files removed', out.getvalue())
+
+    def test_dry_run_keeps_files(self):
+        orphan = self.store('uploads/recipe/old.jpg', age_minutes=120)
+
+        out = StringIO()
+        call_command('collect_images', dry_run=True, stdout=out)
+
+        self.assertTrue(image_storage.exists(orphan))
+        self.assertIn('1 orphan files would be removed', out.getvalue())
+
+
+class ImportRecipesCommandTest(TestCase):
+    # test the import_recipes command
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+
+    def write_file(self, content, suffix='.ndjson'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def ndjson(self, count, start=0):
+        return ''.join(
+            json.dumps({'title': f'recipe {i}', 'time_minutes': 5, 'price': '2.50',
+                        'tags': [{'id': 1, 'name': 'Vegan'}, {'id': 2, 'name': f'tag {i % 2}'}],
+                        'ingredients': ['Salt']}) + '\n'
+            for i in range(start, start + count)
+        )
+
+    def test_import_ndjson(self):
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        path = self.write_file(self.ndjson(5))
+
+        call_command('import_recipes', path, email=self.user.email, chunk_size=2, stdout=StringIO())
+
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)  # Vegan reused, tag 0 and tag 1 created
+        self.assertIn(existing, recipes.get(title='recipe 3').tags.all())
+        self.assertEqual(list(recipes.get(title='recipe 3').ingredients.values_list('name', flat=True)), ['Salt'])
+
+    def test_import_csv_skips_invalid_rows(self):
+        path = self.write_file(
+            'title,time_minutes,price,tags,ingredients\n'
+            'Curry,30,4.50,Thai|Hot,Rice\n'
+            'Broken,not-a-number,4.50,,\n',
+            suffix='.csv',
+        )
+        err = StringIO()
+
+        call_command('import_recipes', path, email=self.user.email, stdout=StringIO(), stderr=err)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Curry')
+        self.assertEqual(sorted(recipe.tags.values_list('name', flat=True)), ['Hot', 'Thai'])
+        self.assertIn('row 2', err.getvalue())
+
+    def test_import_skips_broken_lines(self):
+        path = self.write_file(self.ndjson(1) + '{"title": \n' + '[1]\n' + self.ndjson(1, start=1))
+        err = StringIO()
+
+        call_command('import_recipes', path, email=self.user.email, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertIn('row 2: {"row": ["Invalid JSON', err.getvalue())
+        self.assertIn('row 3: {"row": ["Expected a JSON object."]}', err.getvalue())
+        job = ImportJob.objects.get(user=self.user)
+        self.assertEqual((job.rows_done, job.finished), (4, True))
+
+    def test_import_resumes_after_failure(self):
+        path = self.write_file(self.ndjson(6))
+
+        with patch('core.management.commands.import_recipes.create_recipes',
+                   side_effect=[None, RuntimeError('database went away')]) as patched_create, \
+                patch('core.management.commands.import_recipes.invalidate_user_responses') as patched_invalidate:
+            with self.assertRaises(RuntimeError):
+                call_command('import_recipes', path, email=self.user.email, chunk_size=2, stdout=StringIO())
+            self.assertEqual(patched_create.call_count, 2)
+        self.assertEqual(ImportJob.objects.get(user=self.user).rows_done, 2)  # the failed chunk rolled back
+        self.assertEqual(patched_invalidate.call_count, 1)  # the committed chunk isn't hidden by cached lists
+
+        out = StringIO()
+        call_command('import_recipes', path, email=self.user.email, chunk_size=2, stdout=out)
+
+        self.assertIn('resuming', out.getvalue())
+        titles = set(Recipe.objects.filter(user=self.user).values_list('title', flat=True))
+        self.assertEqual(titles, {'recipe 2', 'recipe 3', 'recipe 4', 'recipe 5'})  # first chunk was mocked
+
+    def test_import_finished_job_needs_restart(self):
+        path = self.write_file(self.ndjson(1))
+        call_command('import_recipes', path, email=self.user.email, stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, email=self.user.email, stdout=StringIO())
+
+        call_command('import_recipes', path, email=self.user.email, restart=True, stdout=StringIO())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
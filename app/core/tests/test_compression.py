@@ -0,0 +1,94 @@
+"""
+Tests for the response compression middleware
+"""
+import gzip
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.compression import choose_coding, CODINGS
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ChooseCodingTests(SimpleTestCase):
+    """Test content codings are picked from Accept-Encoding"""
+
+    def test_client_q_values_win(self):
+        self.assertEqual(choose_coding('br;q=0.5, gzip', ['br', 'gzip']), 'gzip')
+
+    def test_server_preference_breaks_ties(self):
+        self.assertEqual(choose_coding('gzip, br', ['br', 'zstd', 'gzip']), 'br')
+        self.assertEqual(choose_coding('*', ['zstd', 'gzip']), 'zstd')
+
+    def test_refused_and_unknown(self):
+        self.assertIsNone(choose_coding('gzip;q=0, deflate', ['gzip']))
+        self.assertIsNone(choose_coding('', ['gzip']))
+        self.assertIsNone(choose_coding('*;q=0', ['gzip']))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=500, ALLOW_LOCAL_CACHE=True)
+class CompressionMiddlewareTests(TestCase):
+    """Test API responses are compressed"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _add_recipes(self, count):
+        for i in range(count):
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=10, price='5.00')
+
+    def test_gzip_list(self):
+        """Test big responses are gzipped with a weak ETag."""
+        self._add_recipes(20)
+        plain = self.client.get(RECIPES_URL)
+        cache.clear()
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertTrue(res['ETag'].startswith('W/"'))
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+
+    def test_small_or_not_accepted(self):
+        """Test small responses and clients without a shared coding get the body as it is."""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+        self._add_recipes(20)
+        cache.clear()
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_compressed_once_per_cached_response(self):
+        """Test repeated hits of a cached response reuse its compressed body."""
+        self._add_recipes(20)
+        compress = Mock(side_effect=CODINGS['gzip'])
+
+        with patch.dict(CODINGS, {'gzip': compress}):
+            first = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        compress.assert_called_once()
+        self.assertEqual(first.content, second.content)
+
+    def test_streaming_export(self):
+        """Test streamed exports are gzipped as they are sent."""
+        self._add_recipes(3)
+
+        res = self.client.get(reverse('recipe:recipe-export'), HTTP_ACCEPT_ENCODING='br;q=1, gzip;q=0.8')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(b''.join(res.streaming_content)).splitlines()), 3)
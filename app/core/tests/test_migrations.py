@@ -0,0 +1,41 @@
+"""
+Tests for data migrations
+"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateNamesMigrationTest(TransactionTestCase):
+    """Test 0007 merges duplicate tag and ingredient names before making them unique"""
+
+    migrate_from = [('core', '0006_recipe_image')]
+    migrate_to = [('core', '0007_recipe_indexes_unique_names')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()  # the applied migrations changed since the last executor
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())  # back to the latest schema
+        super().tearDown()
+
+    def test_duplicates_merged(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+        user = User.objects.create(email='user@example.com', password='x')
+        kept = Tag.objects.create(user=user, name='dup')
+        extra = Tag.objects.create(user=user, name='dup')
+        recipe = Recipe.objects.create(user=user, title='Soup', time_minutes=5, price='2.00')
+        recipe.tags.add(extra)
+
+        apps = self.migrate(self.migrate_to)
+
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+        self.assertEqual(list(Tag.objects.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(list(Recipe.objects.get(id=recipe.id).tags.values_list('id', flat=True)), [kept.id])
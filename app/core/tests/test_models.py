@@ -1,10 +1,13 @@
 #  test models
 
+import hashlib
+import tempfile
 from decimal import Decimal
+from django.db import IntegrityError
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from .. import models
-from unittest.mock import patch
 
 
 def create_user(email='user@example.com', password='test-pass123'):  # helper function
@@ -78,11 +81,32 @@ class ModelTest(TestCase):
         )
         self.assertEqual(str(ingredient), ingredient.name)
 
-    @patch('core.models.uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        """Test generating image path."""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.recipe_image_file_path(None, 'example.jpg')
+    def test_tag_name_unique_per_user(self):
+        """Test a user can't have two tags with the same name, other users can"""
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=other_user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
 
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+    def test_ingredient_name_unique_per_user(self):
+        """Test a user can't have two ingredients with the same name"""
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name='Salt')
+
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name='Salt')
+
+    def test_recipe_file_name_content_hash(self):
+        """Test naming image files by the hash of their bytes."""
+        recipe = models.Recipe.objects.create(user=create_user(), title='Pie', time_minutes=5, price=Decimal('2.00'))
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.image.save('example.JPG', ContentFile(b'image bytes'))
+                file_path = recipe.image.name
+                recipe.image.delete()
+
+        self.assertEqual(file_path, f'uploads/recipe/{hashlib.sha256(b"image bytes").hexdigest()}.jpg')
+        self.assertFalse(models.StoredImage.objects.filter(name=file_path).exists())  # collected
@@ -0,0 +1,87 @@
+"""
+Tests for the JSON renderer and parser
+"""
+import datetime
+import io
+import json
+import math
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.functional import lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+DATA = {
+    'price': Decimal('5.50'),
+    'updated_at': datetime.datetime(2023, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+    'local': timezone.make_aware(datetime.datetime(2023, 5, 1, 12, 30), datetime.timezone(datetime.timedelta(hours=2))),
+    'day': datetime.date(2023, 5, 1),
+    'duration': datetime.timedelta(minutes=90),
+    'title': 'Crème brûlée \u2028\u2029 "quoted"',  # line separators are escaped for javascript
+    'lazy': lazy(lambda: 'translated', str)(),
+    'ids': [1, 2, 3],
+    'nested': {1: None, 'flag': True, 'ratio': 0.5},
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test FastJSONRenderer renders the bytes DRF's JSONRenderer does"""
+
+    def test_same_bytes(self):
+        self.assertEqual(FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_same_bytes_without_orjson(self):
+        with patch('core.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_integer_over_64_bits(self):
+        data = {'big': 2 ** 70}  # orjson refuses it, the stdlib encodes it
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_floats(self):
+        """Test the known float differences: exponent notation differs, NaN and infinities become null."""
+        data = {'ratio': 0.1, 'big': 1e16, 'small': 1e-05, 'nan': math.nan, 'inf': math.inf}
+
+        ret = FastJSONRenderer().render(data)
+
+        self.assertEqual(ret, b'{"ratio":0.1,"big":1e16,"small":0.00001,"nan":null,"inf":null}')
+        finite = {key: value for key, value in data.items() if math.isfinite(value)}
+        self.assertEqual(json.loads(FastJSONRenderer().render(finite)), json.loads(JSONRenderer().render(finite)))
+        with self.assertRaises(ValueError):  # DRF refuses them under STRICT_JSON
+            JSONRenderer().render({'nan': math.nan})
+
+    def test_indent(self):
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(FastJSONRenderer().render(DATA, media_type), JSONRenderer().render(DATA, media_type))
+
+    def test_none(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test FastJSONParser parses like DRF's JSONParser"""
+
+    def _parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), 'application/json', {'encoding': 'utf-8'})
+
+    def test_same_data(self):
+        body = '{"title": "Crème", "price": "5.50", "ids": [1, 2], "ratio": 0.5, "big": 1180591620717411303424}'
+
+        data = self._parse(FastJSONParser(), body.encode())
+
+        self.assertEqual(data, self._parse(JSONParser(), body.encode()))
+
+    def test_invalid_json(self):
+        for body in [b'{"title": ', b'{"price": NaN}']:
+            with self.assertRaises(ParseError):
+                self._parse(FastJSONParser(), body)
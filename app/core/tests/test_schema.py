@@ -0,0 +1,68 @@
+"""
+Tests for the prebuilt OpenAPI schema
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaViewTests(SimpleTestCase):
+    """Test the schema is generated once and revalidated with its ETag"""
+
+    def setUp(self):
+        schema.clear_schema_cache()
+        self.addCleanup(schema.clear_schema_cache)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'schema.json')
+
+    def test_build_schema_served(self):
+        """Test the view serves the file written by build_schema without generating it."""
+        call_command('build_schema', file=self.path, stdout=StringIO())
+        with open(self.path) as fh:
+            built = json.load(fh)
+        built['info']['title'] = 'Frozen'  # only the file can have it
+        with open(self.path, 'w') as fh:
+            json.dump(built, fh)
+
+        with override_settings(SCHEMA_FILE=self.path), patch('core.schema.generate_schema') as generate:
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        generate.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.content)['info']['title'], 'Frozen')
+        self.assertIn('/api/recipe/recipes/', json.loads(res.content)['paths'])
+
+    @override_settings(SCHEMA_FILE='/nonexistent/schema.json')
+    def test_generated_once_without_file(self):
+        """Test without a built file the schema is generated on the first request only."""
+        with patch('core.schema.generate_schema', wraps=schema.generate_schema) as generate:
+            yaml = self.client.get(SCHEMA_URL)
+            again = self.client.get(SCHEMA_URL)
+            self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        generate.assert_called_once()
+        self.assertTrue(yaml['Content-Type'].startswith('application/vnd.oai.openapi'))
+        self.assertIn(b'openapi: 3', yaml.content)
+        self.assertEqual(yaml.content, again.content)
+
+    @override_settings(SCHEMA_FILE='/nonexistent/schema.json')
+    def test_etag_not_modified(self):
+        """Test clients holding the current schema get a 304."""
+        res = self.client.get(SCHEMA_URL)
+        self.assertIn('no-cache', res['Cache-Control'])
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
@@ -0,0 +1,204 @@
+"""
+Batched writes of recipes with their tags and ingredients
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from core.image_refs import release_images
+from core.models import Deletion, Recipe, Tag, Ingredient  # noqa
+from core.search import update_search_vectors
+from core.signals import bulk_deletion
+
+from .queries import plan_recipe_queryset
+from .serializers import RecipeBulkOperationSerializer, RecipeDetailSerializer
+
+MAX_OPERATIONS = 500  # per bulk request, bigger syncs go through more requests or the import command
+
+
+class NameResolver:
+    """Maps a user's tag or ingredient names to ids, creating missing names in bulk"""
+
+    def __init__(self, model, user, preload=False):
+        self.model = model
+        self.user = user
+        self.ids = {}  # name -> id, grows as names are resolved
+        if preload:  # one query for the user's whole vocabulary, good for big imports
+            self.ids = dict(model.objects.filter(user=user).values_list('name', 'id'))
+
+    def resolve(self, names):
+        """Return {name: id} for the names, one lookup and one insert at most for the unknown ones."""
+        unknown = {name for name in names if name not in self.ids}
+        if unknown:
+            self.ids.update(self.model.objects.filter(user=self.user, name__in=unknown).values_list('name', 'id'))
+            missing = [name for name in unknown if name not in self.ids]
+            if missing:
+                self.model.objects.bulk_create(  # another writer may add the same names meanwhile, skip those
+                    [self.model(user=self.user, name=name) for name in missing],
+                    ignore_conflicts=True,
+                )
+                # ignore_conflicts doesn't return ids, so select the rows again whoever created them
+                self.ids.update(
+                    self.model.objects.filter(user=self.user, name__in=missing).values_list('name', 'id')
+                )
+        return {name: self.ids[name] for name in names}
+
+
+def link_rows(field, pairs):
+    """Insert (recipe_id, tag or ingredient id) pairs into the recipe M2M table with one bulk insert."""
+    through = getattr(Recipe, field).through
+    target = 'tag_id' if field == 'tags' else 'ingredient_id'
+    through.objects.bulk_create(
+        [through(**{'recipe_id': recipe_id, target: obj_id}) for recipe_id, obj_id in pairs],
+        ignore_conflicts=True,
+    )
+
+
+def create_recipes(user, rows, tag_resolver, ingredient_resolver):
+    """Create recipes from rows of recipe 'fields' plus 'tags'/'ingredients' lists of names (or None)."""
+    rows = [{**row, 'tags': row['tags'] or [], 'ingredients': row['ingredients'] or []} for row in rows]
+    tag_ids = tag_resolver.resolve({name for row in rows for name in row['tags']})
+    ingredient_ids = ingredient_resolver.resolve({name for row in rows for name in row['ingredients']})
+
+    recipes = Recipe.objects.bulk_create(  # ids come back with RETURNING on postgres
+        [Recipe(user=user, **row['fields']) for row in rows],
+    )
+    link_rows('tags', {(recipe.id, tag_ids[name]) for recipe, row in zip(recipes, rows) for name in row['tags']})
+    link_rows('ingredients', {
+        (recipe.id, ingredient_ids[name]) for recipe, row in zip(recipes, rows) for name in row['ingredients']
+    })
+    update_search_vectors(Recipe.objects.filter(id__in=[recipe.id for recipe in recipes]))
+    return recipes
+
+
+def _names(items):
+    """Names of validated nested tags or ingredients, None when the field wasn't sent."""
+    if items is None:
+        return None
+    return list(dict.fromkeys(item['name'] for item in items))
+
+
+def split_nested(validated_data):
+    """Split validated recipe data into the row shape of create_recipes/update_recipes."""
+    fields = dict(validated_data)
+    return {
+        'tags': _names(fields.pop('tags', None)),
+        'ingredients': _names(fields.pop('ingredients', None)),
+        'fields': fields,
+    }
+
+
+def _replace_links(field, recipes_rows, ids):
+    """Set the M2M rows of the recipes to the names of their rows, writing only the difference."""
+    through = getattr(Recipe, field).through
+    target = 'tag_id' if field == 'tags' else 'ingredient_id'
+    wanted = {
+        (recipe.id, ids[name]) for recipe, row in recipes_rows if row[field] is not None for name in row[field]
+    }
+    replaced = [recipe.id for recipe, row in recipes_rows if row[field] is not None]
+    if not replaced:
+        return
+    current = {
+        (recipe_id, obj_id): row_id
+        for row_id, recipe_id, obj_id in through.objects.filter(recipe_id__in=replaced).values_list(
+            'id', 'recipe_id', target)
+    }
+    stale = [row_id for pair, row_id in current.items() if pair not in wanted]
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    link_rows(field, wanted - current.keys())
+
+
+def update_recipes(recipes_rows, tag_resolver, ingredient_resolver):
+    """Update (recipe, row) pairs with one bulk update and batched M2M changes, row lists may be None."""
+    tag_ids = tag_resolver.resolve({name for _, row in recipes_rows for name in row['tags'] or []})
+    ingredient_ids = ingredient_resolver.resolve(
+        {name for _, row in recipes_rows for name in row['ingredients'] or []}
+    )
+    now = timezone.now()  # bulk_update skips auto_now
+    changed_fields = {'updated_at'}
+    for recipe, row in recipes_rows:
+        for attr, value in row['fields'].items():
+            setattr(recipe, attr, value)
+            changed_fields.add(attr)
+        recipe.updated_at = now
+
+    Recipe.objects.bulk_update([recipe for recipe, _ in recipes_rows], sorted(changed_fields))
+    _replace_links('tags', recipes_rows, tag_ids)
+    _replace_links('ingredients', recipes_rows, ingredient_ids)
+    update_search_vectors(Recipe.objects.filter(id__in=[recipe.id for recipe, _ in recipes_rows]))
+
+
+def delete_recipes(user, ids):
+    """Delete the user's recipes with one tombstone insert and one image release for all of them."""
+    recipes = Recipe.objects.filter(user=user, id__in=ids)
+    rows = list(recipes.values_list('id', 'image'))
+    with bulk_deletion():  # instead of an INSERT and a release per recipe from the post_delete receivers
+        recipes.delete()
+    Deletion.objects.bulk_create(
+        [Deletion(user_id=user.id, kind=Deletion.RECIPE, object_id=recipe_id) for recipe_id, _ in rows],
+    )
+    release_images([image for _, image in rows])
+
+
+def run_operations(user, operations, context):
+    """Validate every bulk operation, then apply all of them in one transaction or none.
+
+    Returns the result of every operation and whether they were applied.
+    """
+    ids = [op['id'] for op in operations if 'id' in op]
+    recipes = {recipe.id: recipe for recipe in Recipe.objects.filter(user=user, id__in=ids)}  # one query for all
+    results, creates, updates, deletes, seen = [], [], [], [], set()
+
+    for op in operations:
+        result = {'op': op['op'], 'id': op.get('id')}
+        results.append(result)
+        if op['op'] != RecipeBulkOperationSerializer.CREATE:
+            if op['id'] not in recipes:
+                result.update(status=status.HTTP_404_NOT_FOUND, errors={'detail': 'Not found.'})
+                continue
+            if op['id'] in seen:
+                result.update(status=status.HTTP_400_BAD_REQUEST,
+                              errors={'id': 'Only one operation per recipe is allowed.'})
+                continue
+            seen.add(op['id'])
+        if op['op'] == RecipeBulkOperationSerializer.DELETE:
+            result['status'] = status.HTTP_204_NO_CONTENT
+            deletes.append(op['id'])
+            continue
+
+        instance = recipes.get(op.get('id'))
+        serializer = RecipeDetailSerializer(instance, data=op['data'], partial=instance is not None, context=context)
+        if not serializer.is_valid():
+            result.update(status=status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+            continue
+        row = split_nested(serializer.validated_data)
+        if instance is None:
+            result['status'] = status.HTTP_201_CREATED
+            creates.append((result, row))
+        else:
+            result['status'] = status.HTTP_200_OK
+            updates.append((instance, row))
+
+    if any(result['status'] >= status.HTTP_400_BAD_REQUEST for result in results):
+        for result in results:
+            if result['status'] < status.HTTP_400_BAD_REQUEST:
+                result['status'] = None  # valid, but not applied because the request was rejected
+        return results, False
+
+    with transaction.atomic():
+        tag_resolver, ingredient_resolver = NameResolver(Tag, user), NameResolver(Ingredient, user)
+        created = create_recipes(user, [row for _, row in creates], tag_resolver, ingredient_resolver)
+        update_recipes(updates, tag_resolver, ingredient_resolver)
+        if deletes:
+            delete_recipes(user, deletes)
+
+    for (result, _), recipe in zip(creates, created):
+        result['id'] = recipe.id
+    written = [result['id'] for result in results if result['status'] != status.HTTP_204_NO_CONTENT]
+    fresh = {recipe.id: recipe for recipe in plan_recipe_queryset(Recipe.objects.filter(id__in=written), 'retrieve')}
+    for result in results:
+        if result['id'] in fresh:
+            result['data'] = RecipeDetailSerializer(fresh[result['id']], context=context).data
+
+    return results, True
@@ -0,0 +1,152 @@
+"""
+Per-user response cache for recipe APIs
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.caching import cache_is_shared
+from core.models import Deletion, Recipe, Tag, Ingredient  # noqa
+
+ID_LIST_PARAMS = ('tags', 'ingredients')  # comma separated ids, order and repeats don't change the result
+NAME_LIST_PARAMS = ('fields', 'expand')  # comma separated field names, the output order is fixed
+
+
+def _generation_key(user_id):
+    return f'recipe-gen:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the user's current cache generation, the time in ns of the user's last write."""
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:  # unknown or evicted, now is a safe upper bound of the last write
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_user_responses(user):
+    """Move the user's generation forward so every cached response of the user is stale."""
+    key = _generation_key(user.id)
+    generation = max(time.time_ns(), (cache.get(key) or 0) + 1)  # always forward, even if the clock isn't
+    cache.set(key, generation, timeout=None)
+
+
+def _latest(queryset, field):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])  # top of the (user, field) index
+
+
+def data_generation(user_id):
+    """Time in ns of the user's last write read from the database, None without any data.
+
+    updated_at of recipes, tags and ingredients and the tombstones of deletes, with one query. The
+    validators of conditional_response without a shared cache.
+    """
+    row = get_user_model().objects.filter(id=user_id).values_list(
+        _latest(Recipe.objects.filter(user_id=OuterRef('id')), 'updated_at'),
+        _latest(Tag.objects.filter(user_id=OuterRef('id')), 'updated_at'),
+        _latest(Ingredient.objects.filter(user_id=OuterRef('id')), 'updated_at'),
+        _latest(Deletion.objects.filter(user_id=OuterRef('id')), 'deleted_at'),
+    ).first()
+    moments = [moment for moment in row or () if moment is not None]
+    if not moments:
+        return None
+    return int(max(moments).timestamp() * 1_000_000) * 1000  # microseconds, like the columns
+
+
+def normalize_params(query_params):
+    """Query params as a sorted tuple, id lists sorted and deduplicated."""
+    normalized = []
+    for name in sorted(query_params):
+        value = query_params.get(name)
+        if name in ID_LIST_PARAMS + NAME_LIST_PARAMS:
+            value = ','.join(sorted(set(value.split(',')), key=lambda v: (len(v), v)))
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+def _request_digest(request, action, kwargs):
+    """Hash of everything besides the user's data that changes a response."""
+    raw = repr((
+        request.get_host(),  # pagination links are absolute urls
+        getattr(request, 'accepted_media_type', None),
+        action,
+        tuple(sorted(kwargs.items())),
+        normalize_params(request.query_params),
+    ))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def response_cache_key(request, action, kwargs):
+    """Key of a cached response for the user, generation, action, object and query params."""
+    user_id = request.user.id
+    return f'recipe-resp:{user_id}:{get_generation(user_id)}:{_request_digest(request, action, kwargs)}'
+
+
+def cached_response(view_method):
+    """Cache the data of successful responses of a viewset action per user until the user writes."""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not cache_is_shared():  # other workers would keep serving what this one invalidates
+            return view_method(self, request, *args, **kwargs)
+        key = response_cache_key(request, self.action, kwargs)
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response.cache_key = key  # core.compression caches the compressed bodies under it
+            return response
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+            response.cache_key = key
+        return response
+
+    return wrapper
+
+
+def conditional_response(view_method):
+    """Answer If-None-Match/If-Modified-Since with 304 using the user's generation, without running the view.
+
+    Without a shared cache the generation is read from the database with data_generation.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        user_id = request.user.id
+        if cache_is_shared():
+            generation = get_generation(user_id)
+        else:  # the cached generation would be per process
+            generation = data_generation(user_id)
+            overlap = settings.SYNC_OVERLAP_SECONDS * 1_000_000_000
+            if generation is None or generation > time.time_ns() - overlap:
+                # a transaction committing late may still add an older updated_at, no validators until it can't
+                return view_method(self, request, *args, **kwargs)
+        digest = hashlib.sha256(
+            f'{user_id}:{generation}:{_request_digest(request, self.action, kwargs)}'.encode()
+        ).hexdigest()
+        etag = quote_etag(digest)  # strong, the same generation and request always render the same bytes
+        last_modified = generation // 1_000_000_000  # ns to seconds
+        if last_modified >= int(time.time()):  # a write later in this second would have the same date, no date yet
+            last_modified = None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ['Authorization'])  # validators are per user
+        return response
+
+    return wrapper
@@ -0,0 +1,52 @@
+"""
+Streaming export of a user's recipe book
+"""
+import csv
+
+from core.renderers import FastJSONRenderer
+from .rows import RecipeRowSerializer
+from .serializers import RecipeDetailSerializer
+
+CHUNK_SIZE = 500  # recipes read per database round trip, tags and ingredients are read per chunk
+CSV_FIELDS = ['id', 'title', 'description', 'time_minutes', 'price', 'link', 'image', 'updated_at',
+              'tags', 'ingredients']
+FORMATS = {  # output name -> (content type, file extension)
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+class Echo:
+    """File-like object returning what is written, lets csv.writer produce rows lazily"""
+
+    def write(self, value):
+        return value
+
+
+def _serialized(queryset, context):
+    """Serialize recipes like the detail endpoint while the queryset is read in chunks."""
+    return RecipeRowSerializer(RecipeDetailSerializer, context).iterate(queryset, CHUNK_SIZE)
+
+
+def ndjson_rows(queryset, context):
+    """One JSON document per line for every recipe."""
+    renderer = FastJSONRenderer()  # compact bytes like the API responses
+    for data in _serialized(queryset, context):
+        yield renderer.render(data) + b'\n'
+
+
+def csv_rows(queryset, context):
+    """A header and a row for every recipe, tags and ingredients as names separated by '|'."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for data in _serialized(queryset, context):
+        data['tags'] = '|'.join(tag['name'] for tag in data['tags'])
+        data['ingredients'] = '|'.join(ingredient['name'] for ingredient in data['ingredients'])
+        yield writer.writerow([data[field] if data[field] is not None else '' for field in CSV_FIELDS])
+
+
+def export_rows(output, queryset, context):
+    """Rows of the export in the given output format."""
+    if output == 'csv':
+        return csv_rows(queryset, context)
+    return ndjson_rows(queryset, context)
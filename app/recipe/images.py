@@ -0,0 +1,113 @@
+"""
+Resized variants of recipe images, generated in the background by the process_images worker
+"""
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, features
+
+from core.models import ImageJob, Recipe  # noqa
+from core.storage import image_storage, variant_name
+
+from .cache import invalidate_user_responses
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)  # running jobs older than this belong to a dead worker
+
+
+def variant_formats():
+    """Configured output formats this Pillow build can write."""
+    return [fmt for fmt in settings.RECIPE_IMAGE_FORMATS if fmt != 'webp' or features.check('webp')]
+
+
+def stored_variants(source_name):
+    """{size: {format: file name}} of the image when every variant is stored already, else None."""
+    variants = {
+        label: {fmt: variant_name(source_name, label, fmt) for fmt in variant_formats()}
+        for label in settings.RECIPE_IMAGE_SIZES
+    }
+    if all(image_storage.exists(name) for formats in variants.values() for name in formats.values()):
+        return variants
+    return None
+
+
+def enqueue_variants(recipe):
+    """Attach the variants of the recipe's new image, queuing them when the same image wasn't resized before.
+
+    The old variants stay stored with the old image, which is collected once no recipe uses it.
+    """
+    variants = stored_variants(recipe.image.name)  # stock photos and re-uploads are resized once
+    recipe.image_variants = variants or {}  # clients fall back to the original until the new variants are ready
+    recipe.save(update_fields=['image_variants', 'updated_at'])
+    if variants is not None:
+        return None
+    return ImageJob.objects.create(recipe=recipe, source=recipe.image.name)
+
+
+def render_variants(source_name):
+    """Resize the image to every configured size and format, returns {size: {format: file name}}."""
+    variants = stored_variants(source_name)
+    if variants is not None:  # another recipe's job made them
+        return variants
+    variants = {}
+    with image_storage.open(source_name) as fh, Image.open(fh) as original:
+        original = original.convert('RGB')  # webp/jpeg have no palette or alpha to keep for thumbnails
+        for label, max_side in settings.RECIPE_IMAGE_SIZES.items():
+            resized = original.copy()
+            resized.thumbnail((max_side, max_side))  # keeps the aspect ratio, never upscales
+            for fmt in variant_formats():
+                buffer = io.BytesIO()
+                resized.save(buffer, format=PIL_FORMATS[fmt], quality=settings.RECIPE_IMAGE_QUALITY)
+                name = variant_name(source_name, label, fmt)
+                variants.setdefault(label, {})[fmt] = image_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def claim_job():
+    """Take the oldest pending job, or one abandoned by a dead worker, without blocking other workers."""
+    stale = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        job = (
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ImageJob.PENDING) | Q(status=ImageJob.RUNNING, updated_at__lt=stale))
+            .order_by('id')
+            .first()
+        )
+        if job is not None:
+            job.status = ImageJob.RUNNING
+            job.attempts += 1
+            job.save(update_fields=['status', 'attempts', 'updated_at'])
+    return job
+
+
+def process_job(job):
+    """Generate the variants of a claimed job and attach them to the recipe."""
+    try:
+        recipe = Recipe.objects.select_related('user').get(id=job.recipe_id)
+    except Recipe.DoesNotExist:  # deleted meanwhile, its job went with it
+        job.status, job.error = ImageJob.DONE, ''
+        return job
+    try:
+        if recipe.image.name != job.source:  # replaced again meanwhile, a newer job handles it
+            job.status = ImageJob.DONE
+        else:
+            variants = render_variants(job.source)
+            # replaced while rendering: nothing is updated, the variants go when their image is collected
+            Recipe.objects.filter(id=recipe.id, image=job.source).update(
+                image_variants=variants, updated_at=timezone.now(),
+            )
+            invalidate_user_responses(recipe.user)
+            job.status = ImageJob.DONE
+        job.error = ''
+    except Exception as exc:  # noqa  # any failure is recorded on the job and retried
+        job.status = ImageJob.FAILED if job.attempts >= MAX_ATTEMPTS else ImageJob.PENDING
+        job.error = repr(exc)
+    # not save(), a recipe deleted while rendering takes the job with it and there is no row left to update
+    ImageJob.objects.filter(pk=job.pk).update(status=job.status, error=job.error, updated_at=timezone.now())
+    return job
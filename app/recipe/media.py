@@ -0,0 +1,116 @@
+"""
+Serving of recipe image files after the owner check, the transfer itself is handed to the web server when it can
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from core.storage import image_storage
+
+X_ACCEL_REDIRECT = 'x-accel-redirect'  # nginx, the internal location maps MEDIA_ACCEL_PREFIX to MEDIA_ROOT
+X_SENDFILE = 'x-sendfile'  # apache mod_xsendfile, lighttpd
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')  # one range, multiple ranges get the whole file
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileContentNegotiation(DefaultContentNegotiation):
+    """Negotiation for file downloads, image Accept headers must not end in 406 before the file is found"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except (NotAcceptable, Http404):  # ?format= picks the image format, errors are still rendered as JSON
+            return renderers[0], renderers[0].media_type
+
+
+def parse_range(header, size):
+    """(first, last) bytes of a Range header, inclusive, None to send the whole file."""
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:  # suffix range, the last N bytes
+        if not int(last) or not size:
+            raise RangeNotSatisfiable()
+        return max(size - int(last), 0), size - 1
+    first, last = int(first), int(last) if last else None
+    if last is not None and last < first:  # invalid, ignored like no range was asked
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable()
+    return first, size - 1 if last is None else min(last, size - 1)
+
+
+def read_range(path, first, last):
+    """Yield the bytes first..last of a file in chunks."""
+    with open(path, 'rb') as fh:
+        fh.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, size, etag, last_modified):
+    """Stream the file from Python, honoring Range and If-Range."""
+    content_range = None
+    if_range = request.headers.get('If-Range')
+    if if_range is None or if_range in (etag, http_date(last_modified)):  # else the client's copy is outdated
+        try:
+            content_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if content_range is None:
+        return FileResponse(open(path, 'rb'))  # wsgi.file_wrapper may use sendfile for the whole file
+    first, last = content_range
+    response = StreamingHttpResponse(read_range(path, first, last), status=206)
+    response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Content-Length'] = last - first + 1
+    return response
+
+
+def serve_image(request, name):
+    """Response for a stored image file, 304 when the client has it and a web server handoff when configured."""
+    try:
+        stat = os.stat(image_storage.path(name))
+    except (FileNotFoundError, ValueError):
+        raise Http404('No image.')
+    etag = quote_etag(os.path.basename(name))  # strong, names are hashes of the bytes
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = settings.MEDIA_SENDFILE
+        if mode == X_ACCEL_REDIRECT:  # nginx sends the file, with ranges, the worker is free right away
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+        elif mode == X_SENDFILE:
+            response = HttpResponse()
+            response['X-Sendfile'] = image_storage.path(name)
+        else:
+            response = file_response(request, image_storage.path(name), stat.st_size, etag, last_modified)
+        response['Content-Type'] = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'  # the same url shows a new image after an upload
+    return response
@@ -0,0 +1,22 @@
+"""
+Pagination for recipe APIs
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over the newest recipes first, pages cost the same at any depth"""
+    ordering = '-id'  # must match the ordering of the view queryset so the cursor is an index range scan
+    page_size_query_param = 'page_size'  # clients can ask for smaller or bigger pages, PAGE_SIZE is the default
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        """Search results come best match first, id breaks ties."""
+        if 'rank' in queryset.query.annotations:
+            return ('-rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags and ingredients ordered by name"""
+    ordering = ('-name', '-id')  # id breaks ties between equal names so pages are stable
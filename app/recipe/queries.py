@@ -0,0 +1,80 @@
+"""
+Query planning for recipe APIs
+"""
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Tag, Ingredient  # noqa
+
+
+def tags_prefetch():
+    """Prefetch recipe tags selecting only the columns the serializers need."""
+    return Prefetch('tags', queryset=Tag.objects.only('id', 'name').order_by('id'))
+
+
+def ingredients_prefetch():
+    """Prefetch recipe ingredients selecting only the columns the serializers need."""
+    return Prefetch('ingredients', queryset=Ingredient.objects.only('id', 'name').order_by('id'))
+
+
+RECIPE_PLANS = {  # action name -> prefetches, actions not listed here are loaded without prefetching
+    # list and export read .values() rows, recipe.rows fetches their tags and ingredients itself
+    'retrieve': (tags_prefetch, ingredients_prefetch),
+    'update': (tags_prefetch, ingredients_prefetch),
+    'partial_update': (tags_prefetch, ingredients_prefetch),
+}
+
+
+def _links(model):
+    """Recipe M2M rows of the tag or ingredient of the outer query, and the column pointing at it."""
+    through = (Recipe.tags if model is Tag else Recipe.ingredients).through
+    target = 'tag_id' if model is Tag else 'ingredient_id'
+    return through.objects.filter(**{target: OuterRef('pk')}), target
+
+
+def usage_count(model):
+    """Number of recipes using each tag or ingredient, counted on the M2M table for every row it annotates."""
+    links, target = _links(model)
+    return Coalesce(Subquery(links.values(target).annotate(n=Count('*')).values('n')), 0)  # unused have no rows
+
+
+def assigned(model):
+    """Whether a tag or ingredient is used by a recipe, stops at the first M2M row found."""
+    links, _ = _links(model)
+    return Exists(links)
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def filter_by_related(queryset, field, ids, match=MATCH_ANY):
+    """Recipes linked to any or all of the tag or ingredient ids, without joining the M2M table.
+
+    A join returns a recipe once per matching link and needs DISTINCT to collapse them, these
+    subqueries test each recipe once.
+    """
+    through = getattr(Recipe, field).through
+    target = 'tag_id' if field == 'tags' else 'ingredient_id'
+    ids = set(ids)
+    links = through.objects.filter(**{f'{target}__in': ids})
+    if match == MATCH_ALL:  # (recipe, tag) pairs are unique, so the count of matching links is the count of ids
+        matching = links.values('recipe_id').annotate(n=Count('*')).filter(n=len(ids)).values('recipe_id')
+        return queryset.filter(id__in=matching)
+    return queryset.filter(Exists(links.filter(recipe_id=OuterRef('pk'))))
+
+
+def plan_recipe_queryset(queryset, action, fields=None):
+    """Apply the prefetches needed to serialize recipes for the given view action.
+
+    With fields, the names of the serialized fields, only the columns and relations among them are read.
+    """
+    prefetches = [build() for build in RECIPE_PLANS.get(action, ())]
+    if fields is not None:
+        prefetches = [prefetch for prefetch in prefetches if prefetch.prefetch_to in fields]
+        columns = {field.name for field in Recipe._meta.concrete_fields}
+        queryset = queryset.only(*[name for name in fields if name in columns])  # the primary key always is
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+
+    return queryset
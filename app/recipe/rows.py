@@ -0,0 +1,90 @@
+"""
+Read-only recipe serialization from .values() rows for lists and exports
+"""
+from itertools import islice
+
+from rest_framework import serializers
+
+from core.models import Recipe
+from .serializers import image_url, variants_to_urls
+
+PASSTHROUGH = (serializers.IntegerField, serializers.CharField)  # database values are already what they render to
+
+
+class RecipeRowSerializer:
+    """Build the same dicts as a recipe ModelSerializer, without model instances or per-row field machinery.
+
+    The fields and their order are read once from serializer_class, scalar columns come from
+    QuerySet.values() and tags and ingredients are read with one query each for a batch of rows.
+    """
+
+    def __init__(self, serializer_class, context=None, fields=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+        kwargs = {'fields': fields} if fields is not None else {}  # a SparseFieldsMixin serializer picks them
+        fields = serializer_class(context=self.context, **kwargs).fields
+        self.names = list(fields)
+        self.related = {}  # M2M field name -> child field names, like ['id', 'name']
+        self.converters = {}  # column -> callable for values that don't render as they are
+        self.image_converters = {}  # column -> callable of the value and the recipe id, for image URLs
+        for name, field in fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                self.related[name] = list(field.child.fields)
+            elif isinstance(field, serializers.FileField):
+                self.image_converters[name] = self._file_url
+            elif name == 'image_variants':
+                self.image_converters[name] = self._variant_urls
+            elif isinstance(field, serializers.SerializerMethodField):
+                raise TypeError(f'{serializer_class.__name__}.{name} has no row equivalent')
+            elif not isinstance(field, PASSTHROUGH):
+                self.converters[name] = field.to_representation  # decimals, datetimes...
+        # id is always read, tags and ingredients are looked up by it and cursors page by it
+        self.columns = ['id'] + [name for name in self.names if name not in self.related and name != 'id']
+
+    def _file_url(self, name, recipe_id):
+        return image_url(recipe_id, self.request) if name else None
+
+    def _variant_urls(self, variants, recipe_id):
+        return variants_to_urls(recipe_id, variants, self.request)
+
+    def rows(self, queryset):
+        """The .values() queryset the dicts are built from, annotations like rank stay for cursors."""
+        return queryset.values(*self.columns, *queryset.query.annotations)
+
+    def _related_values(self, field, ids):
+        """{recipe id: [child dicts]} of a M2M field for the recipe ids, ordered by child id."""
+        through = getattr(Recipe, field).through
+        target = 'tag' if field == 'tags' else 'ingredient'
+        names = self.related[field]
+        grouped = {recipe_id: [] for recipe_id in ids}
+        links = through.objects.filter(recipe_id__in=ids).order_by(f'{target}__id').values_list(
+            'recipe_id', *[f'{target}__{name}' for name in names])
+        for recipe_id, *values in links:
+            grouped[recipe_id].append(dict(zip(names, values)))
+        return grouped
+
+    def serialize(self, rows):
+        """Serialize a list of rows, with one query per M2M field for all of them."""
+        ids = [row['id'] for row in rows]
+        related = {field: self._related_values(field, ids) for field in self.related} if ids else {}
+        data = []
+        for row in rows:
+            item = {}
+            for name in self.names:
+                if name in self.related:
+                    item[name] = related[name][row['id']]
+                    continue
+                value = row[name]
+                if name in self.image_converters:
+                    item[name] = self.image_converters[name](value, row['id'])
+                    continue
+                converter = self.converters.get(name)
+                item[name] = converter(value) if converter and value is not None else value
+            data.append(item)
+        return data
+
+    def iterate(self, queryset, chunk_size):
+        """Serialize a queryset lazily, reading it in chunks of rows."""
+        rows = self.rows(queryset).iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            yield from self.serialize(chunk)
@@ -1,7 +1,45 @@
 """Serials for recipe APIs"""
 
+from urllib.parse import urlencode
+
+from django.db import models
+from django.urls import reverse
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient  # noqa
+from core.search import update_search_vectors
+
+
+def image_url(recipe_id, request=None, **params):
+    """Absolute URL of the owner checked recipes/{id}/image/ action, params pick a variant"""
+    url = reverse('recipe:recipe-image-file', args=[recipe_id])
+    if params:
+        url = f'{url}?{urlencode(params)}'
+    return request.build_absolute_uri(url) if request else url
+
+
+def variant_urls(recipe, request=None):
+    """URLs of the stored image variants of a recipe like {'thumb': {'webp': url}}"""
+    return variants_to_urls(recipe.id, recipe.image_variants, request)
+
+
+def variants_to_urls(recipe_id, variants, request=None):
+    """URLs of the image variants of a recipe given as {size: {format: file name}}"""
+    return {
+        label: {fmt: image_url(recipe_id, request, size=label, format=fmt) for fmt in formats}
+        for label, formats in variants.items()
+    }
+
+
+class ImageActionField(serializers.ImageField):
+    """ImageField rendering the URL of the owner checked image action, not of the public media files"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return image_url(value.instance.id, self.context.get('request'))
+
+
+IMAGE_FIELD_MAPPING = {**serializers.ModelSerializer.serializer_field_mapping, models.ImageField: ImageActionField}
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -22,43 +60,105 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientUsageSerializer(IngredientSerializer):
+    """Serializer for ingredients with the number of recipes using them"""
+    usage_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['usage_count']
+
+
+class TagUsageSerializer(TagSerializer):
+    """Serializer for tags with the number of recipes using them"""
+    usage_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['usage_count']
+
+
+class SparseFieldsMixin:
+    """Serializer taking fields=[names] to render only those of its fields, all of them by default"""
+
+    def __init__(self, *args, **kwargs):
+        selected = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for tags"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_variants = serializers.SerializerMethodField()
+    serializer_field_mapping = IMAGE_FIELD_MAPPING  # image renders as recipes/{id}/image/
 
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
+        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients', 'image_variants']
         read_only_fields = ['id']
 
-    def _get_or_create_tags(self, tags, recipe):  # underscore in the beginning means it's internal only
-        """Handle getting or creating tags as needed"""
+    def get_image_variants(self, recipe) -> dict:
+        """URLs of the resized images like {'thumb': {'webp': url, 'jpeg': url}}, empty until generated"""
+        return variant_urls(recipe, self.context.get('request'))
+
+    def _resolve_by_name(self, model, items):  # underscore in the beginning means it's internal only
+        """Return the user's objects for the given names, creating the missing ones in bulk"""
         auth_user = self.context['request'].user  # context is the request payload of the view, this will get the user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(  # will not create duplicate tags in system
-                user=auth_user,
-                **tag,  # instead of name=tag['name'] use this in case there is future model fields
-            )
-            recipe.tags.add(tag_obj)  # connects the new created or founded tags to the objects
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """Handle getting or creating ingredients as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
+        names = list(dict.fromkeys(item['name'] for item in items))  # drop repeated names but keep the order
+        if not names:
+            return []
+
+        found = {obj.name: obj for obj in model.objects.filter(user=auth_user, name__in=names)}  # one query for all
+        missing = [name for name in names if name not in found]
+        if missing:
+            model.objects.bulk_create(  # a concurrent request may create the same names, skip those rows
+                [model(user=auth_user, name=name) for name in missing],
+                ignore_conflicts=True,
             )
-            recipe.ingredients.add(ingredient_obj)
+            # ignore_conflicts doesn't return ids, so select the rows again whoever created them
+            found.update({obj.name: obj for obj in model.objects.filter(user=auth_user, name__in=missing)})
+
+        return [found[name] for name in names]
+
+    def _write_m2m(self, recipe, field, objs, replace=False):
+        """Write recipe M2M rows in bulk, with replace only the difference from the stored rows is applied"""
+        manager = getattr(recipe, field)
+        through = manager.through  # the auto generated table connecting recipes to tags or ingredients
+        source = f'{manager.source_field_name}_id'
+        target = f'{manager.target_field_name}_id'
+        wanted = {obj.id for obj in objs}
+
+        current = set()
+        if replace:
+            current = set(through.objects.filter(**{source: recipe.id}).values_list(target, flat=True))
+            stale = current - wanted
+            if stale:
+                through.objects.filter(**{source: recipe.id, f'{target}__in': stale}).delete()
+
+        through.objects.bulk_create(
+            [through(**{source: recipe.id, target: obj_id}) for obj_id in wanted - current],
+            ignore_conflicts=True,
+        )
+        getattr(recipe, '_prefetched_objects_cache', {}).pop(field, None)  # drop stale prefetched rows
+
+    def _set_tags(self, tags, recipe, replace=False):
+        """Handle getting or creating tags as needed and assign them to the recipe"""
+        self._write_m2m(recipe, 'tags', self._resolve_by_name(Tag, tags), replace=replace)
+
+    def _set_ingredients(self, ingredients, recipe, replace=False):
+        """Handle getting or creating ingredients as needed and assign them to the recipe"""
+        self._write_m2m(recipe, 'ingredients', self._resolve_by_name(Ingredient, ingredients), replace=replace)
 
     def create(self, validated_data):
         """Create recipe with tags and ingredients custom logic """
         tags = validated_data.pop('tags', [])  # if tags exists in valid_data...remove it, if return empty list
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)  # models expect data of the Recipe only (no tags, ingredients)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        self._set_tags(tags, recipe)
+        self._set_ingredients(ingredients, recipe)
+        update_search_vectors(Recipe.objects.filter(pk=recipe.pk))  # the links are bulk inserted, without signals
         return recipe
 
     def update(self, instance, validated_data):  # instance is the object that is getting update
@@ -67,17 +167,15 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:  # if the tags are empty list, empty list is not None then clear it. if None then keep it
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_tags(tags, instance, replace=True)  # only the added and removed tags are written
 
         if ingredients is not None:  # don't use if ingredients as it won't run if it's empty str or list as well.
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_ingredients(ingredients, instance, replace=True)
 
         for attr, value in validated_data.items():  # update other fields normally.
             setattr(instance, attr, value)
 
-        instance.save()
+        instance.save()  # after the ingredients, the save indexes them with the title
         return instance
 
 
@@ -86,14 +184,78 @@ class RecipeDetailSerializer(RecipeSerializer):
 
     class Meta(RecipeSerializer.Meta):
         fields = None
-        exclude = ['user']  # cannot be used with fields, also will take __all__ except the excluded list or tuple
+        exclude = ['user', 'search_vector']  # cannot be used with fields, will take __all__ except the excluded
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer to upload image in recipes."""
+    image_variants = serializers.SerializerMethodField()  # emptied on upload, the worker adds the new variants
+    serializer_field_mapping = IMAGE_FIELD_MAPPING
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'true'}}  # the Value of the image is required, if there is image
+
+    def get_image_variants(self, recipe) -> dict:
+        return variant_urls(recipe, self.context.get('request'))
+
+
+class SuggestionSerializer(serializers.Serializer):
+    """Serializer for autocomplete suggestions of tags and ingredients"""
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    usage_count = serializers.IntegerField(read_only=True)  # recipes using it, suggestions are ordered by it
+
+
+class DeletedSerializer(serializers.Serializer):
+    """Serializer for ids deleted since a sync token"""
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+
+
+class RecipeChangesSerializer(serializers.Serializer):
+    """Serializer for the changes of a user's recipes since a sync token"""
+    recipes = RecipeDetailSerializer(many=True, read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = IngredientSerializer(many=True, read_only=True)
+    deleted = DeletedSerializer(read_only=True)
+    sync_token = serializers.CharField(read_only=True)  # pass it back as ?since= in the next sync
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Serializer validating imported recipes, tags and ingredients are plain names"""
+    tags = serializers.ListField(child=serializers.CharField(max_length=255), required=False, default=list)
+    ingredients = serializers.ListField(child=serializers.CharField(max_length=255), required=False, default=list)
+
+    class Meta:
+        model = Recipe
+        fields = ['title', 'description', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
+
+
+class RecipeBulkOperationSerializer(serializers.Serializer):
+    """Serializer for one operation of a bulk request"""
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+    op = serializers.ChoiceField(choices=[CREATE, UPDATE, DELETE])
+    id = serializers.IntegerField(required=False)  # the recipe to update or delete
+    data = serializers.DictField(required=False)  # recipe fields like the detail endpoint, updates are partial
+
+    def validate(self, attrs):
+        if attrs['op'] != self.CREATE and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required for update and delete.'})
+        if attrs['op'] != self.DELETE and 'data' not in attrs:
+            raise serializers.ValidationError({'data': 'This field is required for create and update.'})
+        return attrs
+
+
+class RecipeBulkResultSerializer(serializers.Serializer):
+    """Serializer for the result of one bulk operation"""
+    op = serializers.CharField()
+    id = serializers.IntegerField(allow_null=True)
+    # the status code the operation would have on its own endpoint, null when the request was rejected for others
+    status = serializers.IntegerField(allow_null=True)
+    data = RecipeDetailSerializer(required=False)
+    errors = serializers.DictField(required=False)
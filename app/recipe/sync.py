@@ -0,0 +1,72 @@
+"""
+Delta sync of a user's recipes, tags and ingredients
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from core.models import Deletion, Recipe, Tag, Ingredient  # noqa
+
+from .queries import plan_recipe_queryset
+
+SALT = 'recipe-sync'
+
+
+class InvalidSyncToken(Exception):
+    """The sync token was tampered with or not issued by us"""
+
+
+class ExpiredSyncToken(Exception):
+    """The sync token is older than the tombstones we keep"""
+
+
+def make_token(moment):
+    """Opaque signed token of a point in time."""
+    return signing.dumps(int(moment.timestamp() * 1_000_000), salt=SALT)  # microseconds
+
+
+def read_token(token):
+    """Return the point in time of a token."""
+    try:
+        micros = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise InvalidSyncToken(token)
+    since = datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    if since < timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS):
+        raise ExpiredSyncToken(token)  # tombstones since then may be pruned
+    return since
+
+
+def collect_changes(user, token=None):
+    """Recipes, tags, ingredients and tombstones changed since the token, all of them without one."""
+    started = timezone.now()  # the next sync starts here, taken before reading so nothing falls in between
+    recipes = plan_recipe_queryset(Recipe.objects.filter(user=user), 'retrieve').order_by('id')
+    tags = Tag.objects.filter(user=user).order_by('id')
+    ingredients = Ingredient.objects.filter(user=user).order_by('id')
+    deletions = Deletion.objects.none()
+
+    if token:
+        # transactions committing late may carry slightly older timestamps, overlap a little to catch them
+        since = read_token(token) - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        recipes = recipes.filter(updated_at__gte=since)
+        tags = tags.filter(updated_at__gte=since)
+        ingredients = ingredients.filter(updated_at__gte=since)
+        deletions = Deletion.objects.filter(user_id=user.id, deleted_at__gte=since)
+
+    deleted = {Deletion.RECIPE: [], Deletion.TAG: [], Deletion.INGREDIENT: []}
+    for kind, object_id in deletions.values_list('kind', 'object_id'):
+        deleted[kind].append(object_id)
+
+    return {
+        'recipes': recipes,
+        'tags': tags,
+        'ingredients': ingredients,
+        'deleted': {
+            'recipes': deleted[Deletion.RECIPE],
+            'tags': deleted[Deletion.TAG],
+            'ingredients': deleted[Deletion.INGREDIENT],
+        },
+        'sync_token': make_token(started),
+    }
@@ -0,0 +1,98 @@
+"""
+Test for the tag and ingredient autocomplete.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient  # noqa
+
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+TAGS_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+
+
+class AutocompleteTests(TestCase):
+    """Test name suggestions ranked by usage"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client.force_authenticate(self.user)
+
+    def use(self, obj, times):
+        """Link the tag or ingredient to new recipes."""
+        for i in range(times):
+            recipe = Recipe.objects.create(user=self.user, title=f'r{i}', time_minutes=1, price=Decimal('1.00'))
+            getattr(recipe, 'tags' if isinstance(obj, Tag) else 'ingredients').add(obj)
+
+    def test_prefix_ranked_by_usage(self):
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        salmon = Ingredient.objects.create(user=self.user, name='Salmon')
+        salsa = Ingredient.objects.create(user=self.user, name='salsa')
+        Ingredient.objects.create(user=self.user, name='Sugar')
+        self.use(salmon, 2)
+        self.use(salt, 1)
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'prefix': 'sAl'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': salmon.id, 'name': 'Salmon', 'usage_count': 2},
+            {'id': salt.id, 'name': 'Salt', 'usage_count': 1},
+            {'id': salsa.id, 'name': 'salsa', 'usage_count': 0},
+        ])
+
+    def test_limit(self):
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'prefix': 'tag', 'limit': 2})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Tag 0', 'Tag 1'])
+        self.assertEqual(self.client.get(TAGS_AUTOCOMPLETE_URL, {'limit': 'x'}).status_code, 400)
+
+    def test_no_prefix_most_used(self):
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+        self.use(vegan, 1)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL)
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan', 'Dessert'])
+
+    def test_prefix_is_not_a_pattern(self):
+        """Test LIKE wildcards in the prefix match literally."""
+        Ingredient.objects.create(user=self.user, name='100% juice')
+        Ingredient.objects.create(user=self.user, name='1000 island')
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'prefix': '100%'})
+
+        self.assertEqual([item['name'] for item in res.data], ['100% juice'])
+
+    def test_only_own_names(self):
+        other = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        Ingredient.objects.create(user=other, name='Salt')
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'prefix': 'sa'})
+
+        self.assertEqual(res.data, [])
+
+    def test_counts_follow_writes(self):
+        """Test cached suggestions are refreshed when the user adds a recipe."""
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup', 'time_minutes': 5, 'price': '2.00', 'ingredients': [{'name': 'Leek'}],
+        }, format='json')
+        self.assertEqual(self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'prefix': 'le'}).data[0]['usage_count'], 1)
+
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Pie', 'time_minutes': 5, 'price': '2.00', 'ingredients': [{'name': 'Leek'}],
+        }, format='json')
+
+        self.assertEqual(self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {'prefix': 'le'}).data[0]['usage_count'], 2)
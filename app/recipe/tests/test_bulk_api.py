@@ -0,0 +1,137 @@
+"""
+Test for the recipe bulk API.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Deletion, Recipe, StoredImage, Tag  # noqa
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def create_recipe(user, **params):
+    """Create and return sample recipe"""
+    defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_op(title, tags=()):
+    """Return a create operation."""
+    return {'op': 'create', 'data': {
+        'title': title, 'time_minutes': 10, 'price': '3.00', 'tags': [{'name': name} for name in tags],
+    }}
+
+
+class RecipeBulkAPITests(TestCase):
+    """Test bulk create, update and delete of recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_mixed_operations(self):
+        """Test creates, updates and deletes are applied with a result each."""
+        to_update = create_recipe(user=self.user, title='Old title')
+        to_update.tags.add(Tag.objects.create(user=self.user, name='Drop'))
+        to_delete = create_recipe(user=self.user)
+        payload = [
+            create_op('Curry', tags=['Thai', 'Dinner']),
+            {'op': 'update', 'id': to_update.id, 'data': {'title': 'New title', 'tags': [{'name': 'Thai'}]}},
+            {'op': 'delete', 'id': to_delete.id},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data], [201, 200, 204])
+        created = Recipe.objects.get(id=res.data[0]['id'])
+        self.assertEqual(sorted(created.tags.values_list('name', flat=True)), ['Dinner', 'Thai'])
+        self.assertEqual(res.data[0]['data']['title'], 'Curry')
+        to_update.refresh_from_db()
+        self.assertEqual(to_update.title, 'New title')
+        self.assertEqual(list(to_update.tags.values_list('name', flat=True)), ['Thai'])
+        self.assertEqual(Tag.objects.filter(user=self.user, name='Thai').count(), 1)  # shared by both recipes
+        self.assertFalse(Recipe.objects.filter(id=to_delete.id).exists())
+
+    def test_bulk_all_or_nothing(self):
+        """Test one invalid operation rejects the whole request."""
+        recipe = create_recipe(user=self.user)
+        payload = [
+            create_op('Curry'),
+            {'op': 'update', 'id': recipe.id, 'data': {'time_minutes': 'slow'}},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['status'] for r in res.data], [None, 400])  # the valid one wasn't applied either
+        self.assertNotIn('errors', res.data[0])
+        self.assertIn('time_minutes', res.data[1]['errors'])
+        self.assertFalse(Recipe.objects.filter(title='Curry').exists())
+
+    def test_bulk_other_user_recipe_not_found(self):
+        """Test operations on other users' recipes fail."""
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        recipe = create_recipe(user=other_user)
+
+        res = self.client.post(BULK_URL, [{'op': 'delete', 'id': recipe.id}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0]['status'], status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_operation_needs_id(self):
+        """Test update and delete operations must name a recipe."""
+        res = self.client.post(BULK_URL, [{'op': 'delete'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_queries_batched(self):
+        """Test the queries of a bulk create don't grow with the number of recipes."""
+        def post(count):
+            payload = [create_op(f'{count}-{i}', tags=['Vegan', f'tag {count}-{i}']) for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post(2), post(20))
+
+    @patch('recipe.views.MAX_OPERATIONS', 2)
+    def test_bulk_too_many_operations(self):
+        """Test oversized requests are rejected before any operation is validated."""
+        payload = [{'op': 'unknown'}] * 3  # invalid, but the size is checked first
+
+        with self.assertNumQueries(0):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('At most 2', str(res.data['detail']))
+
+    def test_bulk_delete_batched(self):
+        """Test bulk deletes write tombstones and release images in bulk."""
+        def post_deletes(count):
+            recipes = [create_recipe(user=self.user) for _ in range(count)]
+            Recipe.objects.filter(id__in=[r.id for r in recipes]).update(image='uploads/recipe/shared.jpg')
+            StoredImage.objects.update_or_create(name='uploads/recipe/shared.jpg', defaults={'refs': count})
+            payload = [{'op': 'delete', 'id': recipe.id} for recipe in recipes]
+            with CaptureQueriesContext(connection) as ctx:
+                with self.captureOnCommitCallbacks(execute=True):
+                    res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(Deletion.objects.filter(object_id__in=[r.id for r in recipes]).count(), count)
+            self.assertFalse(StoredImage.objects.exists())  # released by all, then collected
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post_deletes(2), post_deletes(6))
@@ -0,0 +1,270 @@
+"""
+Test for the per-user response cache.
+"""
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Deletion, Recipe, Tag  # noqa
+
+from core.caching import check_shared_cache
+
+from ..cache import normalize_params
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return sample recipe"""
+    defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(ALLOW_LOCAL_CACHE=True)  # the tests run in a single process
+class ResponseCacheTests(TestCase):
+    """Test cached list and detail responses and their invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list call runs no queries."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPE_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)
+
+    def test_detail_served_from_cache(self):
+        """Test a repeated detail call runs no queries."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(detail_url(recipe.id))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.data['id'], recipe.id)
+
+    def test_cache_per_user(self):
+        """Test users never get each other's cached responses."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        self.client.force_authenticate(other_user)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_create_invalidates(self):
+        """Test creating a recipe through the API refreshes the cached list."""
+        self.client.get(RECIPE_URL)
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': Decimal('2.00')}
+        self.client.post(RECIPE_URL, payload)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual([r['title'] for r in res.data['results']], ['Soup'])
+
+    def test_update_and_delete_invalidate(self):
+        """Test updating and deleting a recipe refreshes the cached responses."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(detail_url(recipe.id))
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['title'], 'New title')
+
+        self.client.get(RECIPE_URL)
+        self.client.delete(detail_url(recipe.id))
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_tag_update_invalidates_recipes(self):
+        """Test renaming a tag refreshes cached recipes nesting it."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        recipe.tags.add(tag)
+        self.client.get(RECIPE_URL)
+
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Dinner'})
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'Dinner')
+
+    def test_params_are_part_of_key(self):
+        """Test filtered lists are cached separately."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user).tags.add(tag)
+        create_recipe(user=self.user)
+
+        self.assertEqual(len(self.client.get(RECIPE_URL).data['results']), 2)
+        self.assertEqual(len(self.client.get(RECIPE_URL, {'tags': tag.id}).data['results']), 1)
+        self.assertEqual(len(self.client.get(TAGS_URL, {'assigned_only': 1}).data['results']), 1)
+
+    def test_normalize_params(self):
+        """Test id lists are normalized so equal filters share an entry."""
+        self.assertEqual(
+            normalize_params({'tags': '3,1,3', 'assigned_only': '1'}),
+            normalize_params({'assigned_only': '1', 'tags': '1,3'}),
+        )
+
+
+@override_settings(ALLOW_LOCAL_CACHE=True)
+class ConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified validators of recipe resources"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_etag_not_modified(self):
+        """Test a list with a matching If-None-Match gives 304 without queries."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+        self.assertIn('ETag', res)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_etag_changes_after_write(self):
+        """Test the validator changes once the user writes."""
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_etag_differs_by_params(self):
+        """Test different filters don't share a validator."""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        res = self.client.get(RECIPE_URL, {'tags': '1'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        """Test If-Modified-Since at the Last-Modified gives 304."""
+        self.client.get(TAGS_URL)  # starts the user's generation
+
+        with patch('recipe.cache.time.time', return_value=time.time() + 2):  # that second is over
+            res = self.client.get(TAGS_URL)
+            res = self.client.get(TAGS_URL, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_no_last_modified_within_write_second(self):
+        """Test a write in the second of the validator can't be hidden behind If-Modified-Since."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Vegetarian'})
+
+        res = self.client.get(TAGS_URL)  # same second as the write, a later write would share the date
+
+        self.assertNotIn('Last-Modified', res)
+        self.assertIn('ETag', res)
+
+    def test_etag_per_user(self):
+        """Test a validator of one user never matches for another."""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_updated_at_changes_on_save(self):
+        """Test recipes expose an updated_at that moves on update."""
+        recipe = create_recipe(user=self.user)
+        before = recipe.updated_at
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+        recipe.refresh_from_db()
+
+        self.assertGreater(recipe.updated_at, before)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}})
+class FileBasedResponseCacheTests(ResponseCacheTests):
+    """Run the cache tests against the file based backend"""
+
+
+@override_settings(ALLOW_LOCAL_CACHE=False)
+class ProcessLocalCacheTests(TestCase):
+    """Test nothing is cached in a cache other workers can't invalidate"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_locmem_not_used(self):
+        """Test repeated reads query the database, without validators while the last write is recent."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(4):  # the last write, then recipes, tags and ingredients again
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertNotIn('ETag', res)
+
+    def test_validators_from_database(self):
+        """Test conditional GET works from updated_at and tombstones without a shared cache."""
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(user=self.user)
+        Recipe.objects.update(updated_at=timezone.now() - timedelta(minutes=1))  # older than the overlap
+        res = self.client.get(RECIPE_URL)
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):  # the last write only
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = res['ETag']
+        self.client.delete(detail_url(other.id))
+        Deletion.objects.update(deleted_at=timezone.now() - timedelta(seconds=30))
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)  # the delete is a newer write
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe.id])
+
+    def test_system_check_warns(self):
+        """Test the shared cache check points at the process-local backend."""
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['core.W001'])
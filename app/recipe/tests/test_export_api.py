@@ -0,0 +1,100 @@
+"""
+Test for the recipe export API.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag  # noqa
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, **params):
+    """Create and return sample recipe"""
+    defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportAPITests(TestCase):
+    """Test streaming exports of recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _content(self, res):
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test the default export is one JSON document per recipe."""
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+        create_recipe(user=self.user, title='Soup')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        create_recipe(user=other_user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._content(res).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Soup', 'Curry'])
+        self.assertEqual(rows[1]['tags'], [{'id': recipe.tags.get().id, 'name': 'Thai'}])
+        self.assertEqual(rows[1]['price'], '5.25')
+
+    def test_export_csv(self):
+        """Test the CSV export has a header and tag names."""
+        recipe = create_recipe(user=self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'), Tag.objects.create(user=self.user, name='Hot'))
+
+        res = self.client.get(EXPORT_URL, {'output': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self._content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Curry')
+        self.assertEqual(sorted(rows[0]['tags'].split('|')), ['Hot', 'Thai'])
+
+    def test_export_filtered_by_tags(self):
+        """Test the list filters apply to the export."""
+        recipe = create_recipe(user=self.user, title='Curry')
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        recipe.tags.add(tag)
+        create_recipe(user=self.user, title='Soup')
+
+        res = self.client.get(EXPORT_URL, {'tags': tag.id})
+
+        self.assertEqual(len(self._content(res).splitlines()), 1)
+
+    @patch('recipe.export.CHUNK_SIZE', 2)
+    def test_export_reads_in_chunks(self):
+        """Test tags and ingredients are prefetched per chunk, not per recipe."""
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        for _ in range(6):
+            create_recipe(user=self.user).tags.add(tag)
+
+        res = self.client.get(EXPORT_URL)
+        with self.assertNumQueries(7):  # one recipe cursor read in 3 chunks, tags and ingredients per chunk
+            lines = self._content(res).splitlines()
+
+        self.assertEqual(len(lines), 6)
+
+    def test_export_invalid_output(self):
+        """Test unknown output formats are rejected."""
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,186 @@
+"""
+Test for the recipe image variants and their worker.
+"""
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageJob, Recipe, StoredImage  # noqa
+
+from ..images import claim_job, process_job
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_upload_url(recipe_id):
+    """Create and return an image upload URL."""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_SIZES={'thumb': 20}, RECIPE_IMAGE_FORMATS=['webp', 'jpeg'])
+class ImageVariantTests(TestCase):
+    """Test queued generation of resized recipe images"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Pie', time_minutes=5, price=Decimal('2.00'))
+
+    def upload(self, size=(100, 50), recipe=None):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size).save(image_file, format='JPEG')
+            image_file.seek(0)
+            recipe = recipe or self.recipe
+            return self.client.post(image_upload_url(recipe.id), {'image': image_file}, format='multipart')
+
+    def test_upload_queues_job(self):
+        """Test uploading an image queues its variants."""
+        res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        self.recipe.refresh_from_db()
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.source, self.recipe.image.name)
+
+    def test_worker_generates_variants(self):
+        """Test the worker resizes the image and the API shows the variant urls."""
+        self.upload()
+
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.DONE)
+        self.assertEqual(set(self.recipe.image_variants['thumb']), {'webp', 'jpeg'})
+        with default_storage.open(self.recipe.image_variants['thumb']['webp']) as fh, Image.open(fh) as thumb:
+            self.assertEqual(thumb.format, 'WEBP')
+            self.assertEqual(thumb.size, (20, 10))  # aspect ratio kept
+
+        res = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertTrue(res.data['image_variants']['thumb']['jpeg'].startswith(
+            f'http://testserver/api/recipe/recipes/{self.recipe.id}/image/?size=thumb'))
+
+    def test_same_image_stored_once(self):
+        """Test equal uploads to different recipes share the file and its variants."""
+        other = Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('2.00'))
+        self.upload()
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        res = self.upload(recipe=other)
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(StoredImage.objects.get(name=other.image.name).refs, 2)
+        self.assertEqual(other.image_variants, self.recipe.image_variants)  # attached without a new job
+        self.assertEqual(set(res.data['image_variants']['thumb']), {'webp', 'jpeg'})
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+    def test_replaced_image_collected(self):
+        """Test a new upload deletes the old image and its variants once no recipe uses them."""
+        self.upload()
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+        self.recipe.refresh_from_db()
+        old_image, old_variant = self.recipe.image.name, self.recipe.image_variants['thumb']['jpeg']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(size=(80, 40))
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(default_storage.exists(old_image))
+        self.assertFalse(default_storage.exists(old_variant))
+        self.assertFalse(StoredImage.objects.filter(name=old_image).exists())
+        self.assertTrue(default_storage.exists(self.recipe.image_variants['thumb']['jpeg']))
+
+    def test_shared_image_kept_until_last_recipe_deleted(self):
+        """Test deleting recipes collects their image only with the last one using it."""
+        other = Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('2.00'))
+        self.upload()
+        self.upload(recipe=other)
+        self.recipe.refresh_from_db()
+        name = self.recipe.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('recipe:recipe-detail', args=[other.id]))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_failed_job_retried_then_failed(self):
+        """Test failing jobs go back to the queue until the attempts run out."""
+        self.upload()
+
+        with patch('recipe.images.render_variants', side_effect=OSError('broken image')):
+            for expected in [ImageJob.PENDING, ImageJob.PENDING, ImageJob.FAILED]:
+                job = process_job(claim_job())
+                self.assertEqual(job.status, expected)
+
+        self.assertIn('broken image', job.error)
+        self.assertIsNone(claim_job())
+
+    def test_recipe_deleted_while_running(self):
+        """Test a job whose recipe, and so the job itself, was deleted is done without an error."""
+        self.upload()
+        job = claim_job()
+        Recipe.objects.filter(id=self.recipe.id).delete()
+
+        job = process_job(job)
+
+        self.assertEqual(job.status, ImageJob.DONE)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_worker_survives_failing_job(self):
+        """Test an unexpected error of one job doesn't stop the worker."""
+        self.upload(size=(70, 30))  # sizes no other test resized, so both images are queued
+        other = Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('2.00'))
+        self.upload(size=(30, 70), recipe=other)
+        calls = []
+
+        def fail_first(job):
+            calls.append(job)
+            if len(calls) == 1:
+                raise RuntimeError('database went away')
+            return process_job(job)
+
+        err = StringIO()
+        with patch('core.management.commands.process_images.process_job', side_effect=fail_first):
+            call_command('process_images', once=True, workers=1, stdout=StringIO(), stderr=err)
+
+        self.assertIn('database went away', err.getvalue())
+        self.assertEqual(len(calls), 2)  # the second job was still processed
+        self.assertEqual(ImageJob.objects.get(id=calls[1].id).status, ImageJob.DONE)
+
+    def test_stale_running_job_reclaimed(self):
+        """Test jobs of a dead worker are taken again."""
+        self.upload()
+        job = claim_job()
+        self.assertIsNone(claim_job())  # running jobs aren't taken twice
+
+        ImageJob.objects.filter(id=job.id).update(updated_at=job.updated_at.replace(year=2000))
+
+        self.assertEqual(claim_job().id, job.id)
@@ -4,6 +4,7 @@ Test for the ingredients API.
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
@@ -44,6 +45,7 @@ class PrivateIngredientAPITests(TestCase):
     """Test auth API requests"""
 
     def setUp(self):
+        cache.clear()  # cached responses of earlier tests must not leak in
         self.client = APIClient()
         self.user = create_user(email='user@example.com', password='test-pass123')
         self.client.force_authenticate(self.user)
@@ -59,7 +61,7 @@ class PrivateIngredientAPITests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test ingredients limited to auth user"""
@@ -70,9 +72,9 @@ class PrivateIngredientAPITests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_update_ingredient(self):
         """Test update ingredient"""
@@ -114,8 +116,8 @@ class PrivateIngredientAPITests(TestCase):
         s1 = IngredientSerializer(ing1)
         s2 = IngredientSerializer(ing2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -141,4 +143,29 @@ class PrivateIngredientAPITests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_ingredients_usage_count(self):
+        """Test listing ingredients with the number of recipes using them, in one query."""
+        eggs = Ingredient.objects.create(user=self.user, name='Eggs')
+        mint = Ingredient.objects.create(user=self.user, name='Mint')
+        for title in ('Eggs Benedict', 'Omelets'):
+            recipe = Recipe.objects.create(title=title, time_minutes=5, price=Decimal('3.00'), user=self.user)
+            recipe.ingredients.add(eggs)
+
+        with self.assertNumQueries(2):  # the last write for the validators, then the counted ingredients
+            res = self.client.get(INGREDIENTS_URL, {'usage_count': 1})
+
+        self.assertEqual(res.data['results'], [
+            {'id': mint.id, 'name': 'Mint', 'usage_count': 0},
+            {'id': eggs.id, 'name': 'Eggs', 'usage_count': 2},
+        ])
+        self.assertNotIn('usage_count', self.client.get(INGREDIENTS_URL).data['results'][0])
+
+    def test_invalid_flags(self):
+        """Test flags other than 0 or 1 are a bad request, not a server error."""
+        for param in ('usage_count', 'assigned_only'):
+            res = self.client.get(INGREDIENTS_URL, {param: 'yes'})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(param, res.data)
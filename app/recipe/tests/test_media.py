@@ -0,0 +1,167 @@
+"""
+Test for serving recipe image files to their owner.
+"""
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe  # noqa
+from core.storage import image_storage
+
+from ..media import RangeNotSatisfiable, parse_range
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_url(recipe_id):
+    return reverse('recipe:recipe-image-file', args=[recipe_id])
+
+
+def body(response):
+    """Bytes of a plain or streaming response, the test client closes the file once it is read."""
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Test reading Range headers"""
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))  # clipped to the file
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_ignored_ranges(self):
+        """Test malformed and multiple ranges fall back to the whole file."""
+        for header in (None, '', 'bytes=9-0', 'bytes=0-1,5-6', 'items=0-1', 'bytes=-'):
+            self.assertIsNone(parse_range(header, 100), header)
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 100)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_SENDFILE='')
+class RecipeImageFileTests(TestCase):
+    """Test the owner checked image download"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client.force_authenticate(self.user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 30), color='blue').save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+        self.recipe = Recipe.objects.create(user=self.user, title='Pie', time_minutes=5, price=Decimal('2.00'))
+        self.recipe.image.save('pie.png', ContentFile(self.content))
+
+    def test_owner_downloads_image(self):
+        res = self.client.get(image_url(self.recipe.id), HTTP_ACCEPT='image/webp,image/*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(body(res), self.content)
+
+    def test_other_users_recipe_not_found(self):
+        other = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recipe_without_image(self):
+        recipe = Recipe.objects.create(user=self.user, title='Tea', time_minutes=1, price=Decimal('1.00'))
+
+        res = self.client.get(image_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_variant(self):
+        name = image_storage.save('uploads/recipe/variants/pie-thumb.jpeg', ContentFile(b'thumb bytes'))
+        Recipe.objects.filter(id=self.recipe.id).update(image_variants={'thumb': {'jpeg': name}})
+
+        res = self.client.get(image_url(self.recipe.id), {'size': 'thumb'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(body(res), b'thumb bytes')
+        self.assertEqual(self.client.get(image_url(self.recipe.id), {'size': 'huge'}).status_code, 404)
+
+    def test_serialized_urls_use_action(self):
+        """Test the recipe's image and variant URLs point at this download, not the public media files."""
+        name = image_storage.save('uploads/recipe/variants/pie-thumb.jpeg', ContentFile(b'thumb bytes'))
+        Recipe.objects.filter(id=self.recipe.id).update(image_variants={'thumb': {'jpeg': name}})
+
+        data = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id])).data
+
+        self.assertEqual(data['image'], f'http://testserver{image_url(self.recipe.id)}')
+        variant = data['image_variants']['thumb']['jpeg']
+        self.assertEqual(variant, f'http://testserver{image_url(self.recipe.id)}?size=thumb&format=jpeg')
+        self.assertEqual(body(self.client.get(variant)), b'thumb bytes')
+        listed = self.client.get(reverse('recipe:recipe-list'), {'fields': 'id,image'}).data['results']
+        self.assertEqual(listed, [{'id': self.recipe.id, 'image': data['image']}])  # rows render it the same
+
+    def test_range(self):
+        res = self.client.get(image_url(self.recipe.id), HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(body(res), self.content[10:20])
+
+    def test_range_not_satisfiable(self):
+        res = self.client.get(image_url(self.recipe.id), HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_outdated_if_range_gets_whole_file(self):
+        res = self.client.get(image_url(self.recipe.id), HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(body(res), self.content)
+
+    def test_not_modified(self):
+        res = self.client.get(image_url(self.recipe.id))
+        body(res)  # read, so the test client closes the file
+        etag = res['ETag']
+
+        res = self.client.get(image_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{self.recipe.image.name}')
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(res.content, b'')  # nginx sends the bytes
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+        self.assertEqual(res.content, b'')
@@ -7,7 +7,10 @@ from decimal import Decimal
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -66,6 +69,7 @@ class PrivateRecipeAPITests(TestCase):
     """Test authenticated API Requests"""
 
     def setUp(self):
+        cache.clear()  # cached responses of earlier tests must not leak in
         self.client = APIClient()
         self.user = create_user(email='user@example.com', password='test-pass123')
         self.client.force_authenticate(self.user)
@@ -81,7 +85,7 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to auth user"""
@@ -95,7 +99,7 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -386,9 +390,9 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)  # no tags in param
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])  # no tags in param
 
     def test_filter_by_ingredients(self):
         """Test filter recipes by ingredients"""
@@ -407,9 +411,204 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)  # no tags in param
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])  # no tags in param
+
+    def test_filter_match_all(self):
+        """Test match=all returns only recipes having every tag and every ingredient asked"""
+        vegan = Tag.objects.create(user=self.user, name='vegan')
+        quick = Tag.objects.create(user=self.user, name='quick')
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        both = create_recipe(user=self.user, title='Quick vegan rice')
+        both.tags.add(vegan, quick)
+        both.ingredients.add(rice)
+        one = create_recipe(user=self.user, title='Slow vegan rice')
+        one.tags.add(vegan)
+        one.ingredients.add(rice)
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{vegan.id},{quick.id},{vegan.id}', 'match': 'all'})
+        self.assertEqual([recipe['id'] for recipe in res.data['results']], [both.id])
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{vegan.id},{quick.id}', 'ingredients': rice.id, 'match': 'any'})
+        self.assertEqual([recipe['id'] for recipe in res.data['results']], [one.id, both.id])  # each only once
+
+    def test_filter_bad_params(self):
+        """Test invalid match modes and ids are rejected"""
+        self.assertEqual(self.client.get(RECIPE_URL, {'match': 'some'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(RECIPE_URL, {'tags': '1,a'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_no_distinct(self):
+        """Test tag filters use subqueries, not a join collapsed with DISTINCT"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPE_URL, {'tags': tag.id})
+
+        self.assertNotIn('DISTINCT', ctx.captured_queries[1]['sql'])  # after the last write of the validators
+
+    def test_list_recipes_constant_queries(self):
+        """Test listing recipes doesn't run extra queries per recipe."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+
+        def add_recipes(count):
+            for _ in range(count):
+                recipe = create_recipe(user=self.user)
+                recipe.tags.add(tag)
+                recipe.ingredients.add(ingredient)
+
+        add_recipes(2)
+        with self.assertNumQueries(4):  # last write, recipes, tags and ingredients, no matter how many recipes
+            self.client.get(RECIPE_URL)
+
+        add_recipes(10)
+        cache.clear()  # recipes added through the ORM don't invalidate cached responses
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 12)
+
+    def test_get_recipe_detail_constant_queries(self):
+        """Test recipe detail loads tags and ingredients with a query each."""
+        recipe = create_recipe(user=self.user)
+        for name in ['Dinner', 'Lunch', 'Vegan']:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=name))
+
+        with self.assertNumQueries(4):  # last write, recipe, tags and ingredients
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 3)
+        self.assertEqual(len(res.data['ingredients']), 3)
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= returns only those fields and skips the tag and ingredient queries."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, {'fields': 'title,id,image'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'id': recipe.id, 'title': recipe.title, 'image': None}])
+        self.assertEqual(len(ctx.captured_queries), 2)  # last write and recipes
+        self.assertNotIn('description', ctx.captured_queries[1]['sql'])
+
+    def test_list_expand(self):
+        """Test ?expand= nests only the named relations."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        with self.assertNumQueries(3):  # last write, recipes and tags
+            res = self.client.get(RECIPE_URL, {'fields': 'id,title', 'expand': 'tags'})
+        self.assertEqual(res.data['results'], [{'id': recipe.id, 'title': recipe.title,
+                                                'tags': [{'id': tag.id, 'name': 'Vegan'}]}])
+
+        res = self.client.get(RECIPE_URL, {'expand': ''})
+        self.assertNotIn('tags', res.data['results'][0])
+        self.assertNotIn('ingredients', res.data['results'][0])
+        self.assertIn('price', res.data['results'][0])
+
+    def test_detail_sparse_fields(self):
+        """Test ?fields= on the detail reads only the asked for columns."""
+        recipe = create_recipe(user=self.user, description='Long text')
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(detail_url(recipe.id), {'fields': 'id,title,ingredients'})
+
+        self.assertEqual(res.data, {'id': recipe.id, 'title': recipe.title, 'ingredients': []})
+        self.assertEqual(len(ctx.captured_queries), 3)  # last write, recipe and ingredients, no tags
+        self.assertNotIn('description', ctx.captured_queries[1]['sql'])
+
+    def test_sparse_fields_unknown(self):
+        """Test unknown field and relation names are rejected."""
+        for params in [{'fields': 'id,secret'}, {'expand': 'user'}]:
+            res = self.client.get(RECIPE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_paginated_by_cursor(self):
+        """Test recipe list is paginated with opaque cursors and no count."""
+        recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)  # cursor pagination never runs COUNT(*)
+        self.assertIsNone(res.data['previous'])
+        self.assertEqual([r['id'] for r in res.data['results']], [recipes[4].id, recipes[3].id])
+
+        seen = [r['id'] for r in res.data['results']]
+        next_url = res.data['next']
+        while next_url:  # follow the cursors until the last page
+            res = self.client.get(next_url)
+            seen += [r['id'] for r in res.data['results']]
+            next_url = res.data['next']
+
+        self.assertEqual(seen, [recipe.id for recipe in reversed(recipes)])
+
+    def test_list_recipes_invalid_cursor(self):
+        """Test tampered cursors are rejected."""
+        res = self.client.get(RECIPE_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_recipe_tags_batched(self):
+        """Test the queries creating a recipe don't grow with the number of tags and ingredients."""
+        def post_recipe(count):
+            payload = {
+                'title': f'Recipe with {count}',
+                'time_minutes': 10,
+                'price': Decimal('2.50'),
+                'tags': [{'name': f'tag {count}-{i}'} for i in range(count)],
+                'ingredients': [{'name': f'ingredient {count}-{i}'} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(post_recipe(2), post_recipe(30))
+        recipe = Recipe.objects.get(title='Recipe with 30')
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+
+    def test_create_recipe_repeated_tag_names(self):
+        """Test repeated tag names in a payload resolve to one tag."""
+        payload = {
+            'title': 'Falafel',
+            'time_minutes': 20,
+            'price': Decimal('1.50'),
+            'tags': [{'name': 'Vegan'}, {'name': 'Vegan'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user, name='Vegan').count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_update_recipe_tags_applies_diff(self):
+        """Test updating tags keeps the rows of unchanged tags."""
+        recipe = create_recipe(user=self.user)
+        tag_keep = Tag.objects.create(user=self.user, name='Keep')
+        tag_drop = Tag.objects.create(user=self.user, name='Drop')
+        recipe.tags.add(tag_keep, tag_drop)
+        through = Recipe.tags.through
+        keep_row = through.objects.get(recipe=recipe, tag=tag_keep)
+
+        payload = {'tags': [{'name': 'Keep'}, {'name': 'New'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(id=keep_row.id).exists())  # not cleared and added again
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Keep', 'New'],
+        )
+        self.assertEqual(sorted(t['name'] for t in res.data['tags']), ['Keep', 'New'])
 
 
 class ImageUploadTests(TestCase):
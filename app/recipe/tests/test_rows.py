@@ -0,0 +1,64 @@
+"""
+Test for serializing recipes from .values() rows.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag, Ingredient  # noqa
+
+from ..rows import RecipeRowSerializer
+from ..serializers import RecipeSerializer, RecipeDetailSerializer
+
+
+class RecipeRowSerializerTests(TestCase):
+    """Test the row serializer renders exactly like the model serializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.context = {'request': RequestFactory().get('/')}
+        curry = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=Decimal('5.5'), link='https://example.com',
+            description='Hot', image='uploads/recipe/abc.jpg',
+            image_variants={'thumb': {'webp': 'uploads/recipe/variants/abc-thumb.webp'}},
+        )
+        for name in ['Thai', 'Hot']:
+            curry.tags.add(Tag.objects.create(user=self.user, name=name))
+        curry.ingredients.add(Ingredient.objects.create(user=self.user, name='Rice'))
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+
+    def _assert_same_json(self, serializer_class):
+        recipes = Recipe.objects.order_by('-id')
+        expected = serializer_class(recipes, many=True, context=self.context).data
+        rows = RecipeRowSerializer(serializer_class, self.context)
+
+        data = rows.serialize(list(rows.rows(recipes)))
+
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_list_serializer_output(self):
+        """Test rows render byte for byte like RecipeSerializer."""
+        self._assert_same_json(RecipeSerializer)
+
+    def test_detail_serializer_output(self):
+        """Test rows render like RecipeDetailSerializer, with image URL and timestamps."""
+        self._assert_same_json(RecipeDetailSerializer)
+
+    def test_related_read_once(self):
+        """Test tags and ingredients take one query each whatever the number of rows."""
+        rows = RecipeRowSerializer(RecipeSerializer, self.context)
+        page = list(rows.rows(Recipe.objects.order_by('-id')))
+
+        with self.assertNumQueries(2):
+            rows.serialize(page)
+
+    def test_iterate_in_chunks(self):
+        """Test iterate yields every recipe once."""
+        rows = RecipeRowSerializer(RecipeSerializer, self.context)
+
+        titles = [item['title'] for item in rows.iterate(Recipe.objects.order_by('id'), chunk_size=1)]
+
+        self.assertEqual(titles, ['Curry', 'Soup'])
@@ -0,0 +1,127 @@
+"""
+Test for full-text search of recipes.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+from core.search import update_search_vectors
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchTests(TestCase):
+    """Test the ?search= parameter of the recipe list"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client.force_authenticate(self.user)
+
+    def create(self, title, description='', ingredients=()):
+        """Create a recipe through the API, like clients do."""
+        payload = {
+            'title': title, 'description': description, 'time_minutes': 10, 'price': Decimal('3.00'),
+            'ingredients': [{'name': name} for name in ingredients],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def search(self, terms, **params):
+        res = self.client.get(RECIPE_URL, {'search': terms, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def ids(self, terms):
+        return [recipe['id'] for recipe in self.search(terms).data['results']]
+
+    def test_search_title_ingredients_description(self):
+        soup = self.create('Tomato soup')
+        salad = self.create('Green salad', ingredients=['Cucumber'])
+        pie = self.create('Pie', description='Sweet apple filling')
+        self.create('Plain rice')
+
+        self.assertEqual(self.ids('tomato'), [soup])
+        self.assertEqual(self.ids('cucumber'), [salad])
+        self.assertEqual(self.ids('apple'), [pie])
+
+    def test_search_every_word(self):
+        both = self.create('Tomato soup', ingredients=['Basil'])
+        self.create('Tomato salad')
+
+        self.assertEqual(self.ids('tomato basil'), [both])
+
+    def test_search_only_own_recipes(self):
+        other = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        self.client.force_authenticate(other)
+        self.create('Tomato soup')
+        self.client.force_authenticate(self.user)
+
+        self.assertEqual(self.ids('tomato'), [])
+
+    def test_search_follows_updates(self):
+        recipe_id = self.create('Soup', ingredients=['Leek'])
+        ingredient_id = self.client.get(reverse('recipe:recipe-detail', args=[recipe_id])).data['ingredients'][0]['id']
+
+        self.client.patch(reverse('recipe:ingredient-detail', args=[ingredient_id]), {'name': 'Onion'})
+        self.client.patch(reverse('recipe:recipe-detail', args=[recipe_id]), {'title': 'Broth'}, format='json')
+
+        self.assertEqual(self.ids('onion'), [recipe_id])
+        self.assertEqual(self.ids('leek'), [])
+        self.assertEqual(self.ids('broth'), [recipe_id])
+
+    def test_search_follows_orm_writes(self):
+        """Test recipes edited without the API, like in the admin or a shell, are found by their new words."""
+        recipe = Recipe.objects.get(id=self.create('Soup', ingredients=['Leek']))
+        leek = recipe.ingredients.get()
+
+        with patch('core.signals.update_search_vectors', wraps=update_search_vectors) as update:
+            recipe.title = 'Broth'
+            recipe.save()
+            leek.name = 'Onion'
+            leek.save()
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Fennel'))
+            self.assertEqual(update.call_count, 3)
+
+        self.assertEqual(self.ids('broth'), [recipe.id])
+        self.assertEqual(self.ids('soup'), [])
+        self.assertEqual(self.ids('onion'), [recipe.id])
+        self.assertEqual(self.ids('fennel'), [recipe.id])
+
+        leek.delete()
+        self.assertEqual(self.ids('onion'), [])
+
+    def test_search_pages(self):
+        """Test paging through search results gives every match once."""
+        created = {self.create(f'Tomato dish {i}') for i in range(5)}
+        self.create('Rice')
+
+        seen, res = [], self.search('tomato', page_size=2)
+        while True:
+            seen += [recipe['id'] for recipe in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(sorted(seen), sorted(created))
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranking uses the postgres search vectors')
+    def test_search_ranked(self):
+        """Test title matches rank above ingredient matches above description matches."""
+        in_description = self.create('Stew', description='Served with basil')
+        in_title = self.create('Basil pesto')
+        in_ingredients = self.create('Pasta', ingredients=['Basil'])
+
+        self.assertEqual(self.ids('basil'), [in_title, in_ingredients, in_description])
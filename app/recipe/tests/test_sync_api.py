@@ -0,0 +1,102 @@
+"""
+Test for the recipe changes (delta sync) API.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient  # noqa
+
+from ..sync import make_token
+
+CHANGES_URL = reverse('recipe:recipe-changes')
+
+
+def create_recipe(user, **params):
+    """Create and return sample recipe"""
+    defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeChangesAPITests(TestCase):
+    """Test syncing recipe changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_auth_required(self):
+        """Test auth is required to sync"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_full_sync(self):
+        """Test syncing without a token returns everything of the user."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        Ingredient.objects.create(user=self.user, name='Salt')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='test-pass123')
+        create_recipe(user=other_user)
+
+        res = self.client.get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(res.data['recipes'][0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual([t['name'] for t in res.data['tags']], ['Vegan'])
+        self.assertEqual([i['name'] for i in res.data['ingredients']], ['Salt'])
+        self.assertEqual(res.data['deleted'], {'recipes': [], 'tags': [], 'ingredients': []})
+        self.assertTrue(res.data['sync_token'])
+
+    @override_settings(SYNC_OVERLAP_SECONDS=0)
+    def test_delta_sync(self):
+        """Test syncing with a token returns only the changes since then."""
+        old_recipe = create_recipe(user=self.user, title='Old')
+        deleted_tag = Tag.objects.create(user=self.user, name='Gone')
+        token = make_token(timezone.now())
+
+        changed = create_recipe(user=self.user, title='New')
+        deleted_tag_id = deleted_tag.id
+        deleted_tag.delete()
+        Recipe.objects.filter(id=old_recipe.id).update(updated_at=timezone.now() - timedelta(days=1))
+
+        res = self.client.get(CHANGES_URL, {'since': token})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['recipes']], [changed.id])
+        self.assertEqual(res.data['tags'], [])
+        self.assertEqual(res.data['deleted']['tags'], [deleted_tag_id])
+
+    def test_deleted_recipe_tombstone(self):
+        """Test deleting a recipe through the API reaches the next sync."""
+        recipe = create_recipe(user=self.user)
+        token = self.client.get(CHANGES_URL).data['sync_token']
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        res = self.client.get(CHANGES_URL, {'since': token})
+
+        self.assertEqual(res.data['deleted']['recipes'], [recipe.id])
+
+    def test_invalid_token(self):
+        """Test a tampered token is rejected."""
+        res = self.client.get(CHANGES_URL, {'since': 'not-a-token'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token(self):
+        """Test a token older than the tombstone retention asks for a full sync."""
+        token = make_token(timezone.now() - timedelta(days=365))
+
+        res = self.client.get(CHANGES_URL, {'since': token})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
@@ -3,6 +3,7 @@ Test for the tags API.
 """
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
@@ -43,6 +44,7 @@ class PrivateTagApiTests(TestCase):
     """Test auth API requests."""
 
     def setUp(self):
+        cache.clear()  # cached responses of earlier tests must not leak in
         self.user = create_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
@@ -58,7 +60,7 @@ class PrivateTagApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test list is limited to auth user logged in"""
@@ -70,9 +72,9 @@ class PrivateTagApiTests(TestCase):
         res = self.client.get(TAGS_URL)  # calling get tag API
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)  # make sure it's a one element, it won't include the wrong user one
-        self.assertEqual(res.data[0]['name'], tag.name)  # make sure it's the right one
-        self.assertEqual(res.data[0]['id'], tag.id)  # through both name and id
+        self.assertEqual(len(res.data['results']), 1)  # one element, not the wrong user one
+        self.assertEqual(res.data['results'][0]['name'], tag.name)  # make sure it's the right one
+        self.assertEqual(res.data['results'][0]['id'], tag.id)  # through both name and id
 
     def test_update_tag(self):
         """Test of updating a tag"""
@@ -97,3 +99,29 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
         self.assertFalse(tags.exists())  # make sure that there is no tag object related to user
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paginated by cursor in name order."""
+        for name in ['Breakfast', 'Dinner', 'Lunch', 'Vegan']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 3})
+        self.assertEqual([t['name'] for t in res.data['results']], ['Vegan', 'Lunch', 'Dinner'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual([t['name'] for t in res.data['results']], ['Breakfast'])
+        self.assertIsNone(res.data['next'])
+
+    def test_update_tag_duplicate_name(self):
+        """Test renaming a tag to an existing name of the user fails."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})  # refused by the unique constraint
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['name'], ['You already have an item with this name.'])
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Lunch')
+        res = self.client.patch(detail_url(tag.id), {'name': 'Brunch'})  # the request's transaction is still usable
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
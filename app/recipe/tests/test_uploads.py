@@ -0,0 +1,102 @@
+"""
+Test for the streaming validation of recipe image uploads.
+"""
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe  # noqa
+
+from ..uploads import sniff_format
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_bytes(size=(10, 10), image_format='JPEG', **save_options):
+    """Return an encoded image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color='red').save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageUploadValidationTests(TestCase):
+    """Test byte, pixel and format limits of image uploads"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='test-pass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Pie', time_minutes=5, price=Decimal('2.00'))
+        self.url = reverse('recipe:recipe-upload-image', args=[self.recipe.id])
+
+    def upload(self, content, name='photo.jpg'):
+        upload = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        return self.client.post(self.url, {'image': upload}, format='multipart')
+
+    def test_sniff_format(self):
+        """Test formats are told by their first bytes."""
+        self.assertEqual(sniff_format(image_bytes(image_format='PNG')), 'PNG')
+        self.assertEqual(sniff_format(image_bytes(image_format='WEBP')), 'WEBP')
+        self.assertEqual(sniff_format(image_bytes(image_format='GIF')), 'GIF')
+        self.assertIsNone(sniff_format(b'<html><body>not an image'))
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1024)
+    def test_too_many_bytes(self):
+        """Test uploads bigger than the byte limit are refused."""
+        res = self.upload(b'\xff\xd8\xff' + b'0' * 4096)
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels(self):
+        """Test images over the pixel limit are refused from their header."""
+        res = self.upload(image_bytes(size=(101, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(res.data['image']))
+
+    def test_not_an_image(self):
+        """Test files that aren't images are refused whatever their name."""
+        res = self.upload(b'<html><body>' + b'x' * 100)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_exif_stripped_and_orientation_applied(self):
+        """Test EXIF metadata is removed and the orientation is kept in the pixels."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees
+        exif[0x010F] = 'Phone maker'
+        res = self.upload(image_bytes(size=(40, 20), exif=exif.tobytes()))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as stored:
+            self.assertEqual(dict(stored.getexif()), {})
+            self.assertEqual(stored.size, (20, 40))
+
+    def test_extension_from_content(self):
+        """Test the stored extension follows the sniffed format."""
+        res = self.upload(image_bytes(image_format='PNG'), name='photo.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
@@ -0,0 +1,129 @@
+"""
+Memory bounded validation of recipe image uploads while they stream in
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+from rest_framework import exceptions, status
+from rest_framework.parsers import MultiPartParser
+
+HEADER_LIMIT = 256 * 1024  # bytes kept to read the dimensions, image headers sit at the start of the file
+MAGIC = [  # (offset, signature, format) of the accepted formats
+    (0, b'\xff\xd8\xff', 'JPEG'),
+    (0, b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (0, b'GIF87a', 'GIF'),
+    (0, b'GIF89a', 'GIF'),
+    (8, b'WEBP', 'WEBP'),  # after the RIFF size
+]
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Image is too large.'
+    default_code = 'too_large'
+
+
+def sniff_format(head):
+    """Image format from the first bytes of a file, None when it's not an accepted image."""
+    for offset, signature, image_format in MAGIC:
+        if head[offset:offset + len(signature)] == signature:
+            if image_format == 'WEBP' and not head.startswith(b'RIFF'):
+                continue
+            return image_format
+    return None
+
+
+def check_pixels(size):
+    """Reject images whose decoded pixels would not fit the limit, before they are decoded."""
+    width, height = size
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise exceptions.ValidationError({'image': [
+            f'Image has {width}x{height} pixels, at most {settings.RECIPE_IMAGE_MAX_PIXELS} are allowed.'
+        ]})
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Streams the upload to a temporary file, enforcing byte and pixel limits and stripping EXIF"""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.RECIPE_IMAGE_MAX_BYTES + 64 * 1024:  # room for form fields
+            raise UploadTooLarge()  # refused before a single byte is read
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b''
+        self.image_format = None
+        self.size_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise UploadTooLarge()
+
+        if not self.size_checked and len(self.head) < HEADER_LIMIT:
+            self.head += raw_data[:HEADER_LIMIT - len(self.head)]
+            if self.image_format is None:
+                self.image_format = sniff_format(self.head)
+                if self.image_format is None and len(self.head) >= 12:
+                    raise exceptions.ValidationError({'image': ['Upload a JPEG, PNG, GIF or WebP image.']})
+            if self.image_format is not None:
+                try:  # Pillow only parses the header here, nothing is decoded
+                    with Image.open(io.BytesIO(self.head)) as img:
+                        check_pixels(img.size)
+                        self.size_checked = True
+                except Image.DecompressionBombError:
+                    raise exceptions.ValidationError({'image': ['Image has too many pixels.']})
+                except (OSError, SyntaxError):
+                    pass  # header not complete yet, try again with the next chunk
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        if self.image_format is None:
+            raise exceptions.ValidationError({'image': ['Upload a JPEG, PNG, GIF or WebP image.']})
+
+        upload.seek(0)
+        try:
+            with Image.open(upload) as img:
+                check_pixels(img.size)  # for headers bigger than HEADER_LIMIT
+                return self._without_exif(img, upload)
+        except Image.DecompressionBombError:
+            raise exceptions.ValidationError({'image': ['Image has too many pixels.']})
+        except (OSError, SyntaxError):
+            raise exceptions.ValidationError({'image': ['Upload a valid image, this one is broken.']})
+
+    def _without_exif(self, img, upload):
+        """Re-encode the image without metadata, applying the EXIF orientation first."""
+        if self.image_format == 'GIF':  # no EXIF in GIFs, keep the animation as is
+            upload.seek(0)
+            return upload
+
+        name = os.path.splitext(upload.name)[0] + EXTENSIONS[self.image_format]  # trust the bytes, not the name
+        clean = TemporaryUploadedFile(name, upload.content_type, 0, upload.charset, upload.content_type_extra)
+        image = ImageOps.exif_transpose(img)
+        if self.image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        save_options = {'icc_profile': img.info.get('icc_profile')}  # colors stay right, EXIF/GPS are dropped
+        if self.image_format in ('JPEG', 'WEBP'):
+            save_options['quality'] = 95
+        image.save(clean, format=self.image_format, **{k: v for k, v in save_options.items() if v is not None})
+        clean.size = clean.tell()
+        clean.seek(0)
+        upload.close()
+        return clean
+
+
+class ImageUploadParser(MultiPartParser):
+    """Multipart parser sending file parts through ImageUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request._request.upload_handlers = [ImageUploadHandler(request._request)]  # replaces the memory handler
+        return super().parse(stream, media_type, parser_context)
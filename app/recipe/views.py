@@ -1,16 +1,47 @@
 """
 Views for Recipe APIs
 """
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter, OpenApiTypes
 
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import Recipe, Tag, Ingredient  # noqa
+from core.search import search_recipes
+from user.authentication import CachedTokenAuthentication
 from . import serializers
+from .bulk import MAX_OPERATIONS, run_operations
+from .cache import cached_response, conditional_response, invalidate_user_responses
+from .export import FORMATS, export_rows
+from .images import enqueue_variants
+from .media import FileContentNegotiation, serve_image
+from .pagination import RecipeAttrCursorPagination
+from .rows import RecipeRowSerializer
+from .queries import MATCH_ALL, MATCH_ANY, assigned, filter_by_related, plan_recipe_queryset, usage_count
+from .sync import collect_changes, InvalidSyncToken, ExpiredSyncToken
+from .uploads import ImageUploadParser
+
+RELATIONS = ('tags', 'ingredients')  # nested in recipes, ?expand= picks them
+SPARSE_ACTIONS = ('list', 'retrieve')  # actions taking ?fields= and ?expand=
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated fields to return, all of them by default',
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='Comma separated relations to nest (tags, ingredients), those in fields or all by default',
+    ),
+]
+AUTOCOMPLETE_LIMIT = 10  # suggestions returned without ?limit=
+MAX_AUTOCOMPLETE_LIMIT = 50
 
 
 @extend_schema_view(  # updates swagger OpenAPI schema for documentation which extend the generated DRF-S
@@ -25,60 +56,229 @@ from . import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma Separated list of IDs to filter',
-            )
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=[MATCH_ANY, MATCH_ALL],
+                description='Recipes with any (default) or all of the tags and of the ingredients',
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Words to find in titles, ingredient names and descriptions, best matches first',
+            ),
+            *SPARSE_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
 )
 class RecipeViewsSet(viewsets.ModelViewSet):  # ModelViewSet works directly on a model
     """view for manage recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    queryset = Recipe.objects.defer('search_vector')  # only the database reads the vectors, saves leave them alone
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def _params_to_ints(self, qs):
         """Convert list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            raise ValidationError({'detail': ['Use comma separated ids.']})
+
+    def _params_to_names(self, param, choices):
+        """Convert a comma separated query param to names, all of them among choices."""
+        names = {name.strip() for name in self.request.query_params[param].split(',') if name.strip()}
+        unknown = names.difference(choices)
+        if unknown:
+            raise ValidationError({param: [f'Unknown fields: {", ".join(sorted(unknown))}.']})
+        return names
+
+    def _selected_fields(self):
+        """Fields asked for with ?fields= and ?expand=, in output order, None for all of them."""
+        params = self.request.query_params
+        if self.action not in SPARSE_ACTIONS or ('fields' not in params and 'expand' not in params):
+            return None
+        available = list(self.get_serializer_class()().fields)
+        selected = self._params_to_names('fields', available) if 'fields' in params else set(available)
+        if 'expand' in params:  # relations nest only when expanded
+            selected = selected.difference(RELATIONS) | self._params_to_names('expand', RELATIONS)
+        return [name for name in available if name in selected]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self._selected_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
         """Retrieve recipes list for auth user"""
         tags = self.request.query_params.get('tags')  # get json keys better in a comma separated list
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search', '').strip()
+        match = self.request.query_params.get('match', MATCH_ANY)
+        if match not in (MATCH_ANY, MATCH_ALL):
+            raise ValidationError({'match': [f'Use {MATCH_ANY} or {MATCH_ALL}.']})
         queryset = self.queryset
         if tags:
             tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
+            queryset = filter_by_related(queryset, 'tags', tags_ids, match)  # subqueries, no join to DISTINCT away
         if ingredients:
             ingredients_id = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredients_id)
+            queryset = filter_by_related(queryset, 'ingredients', ingredients_id, match)
+
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        if search:
+            queryset = search_recipes(queryset, search)
+            if 'rank' in queryset.query.annotations:  # postgres, best matches first like the paginator pages them
+                queryset = queryset.order_by('-rank', '-id')
+        # prefetch tags and ingredients only where serialized, read only the asked for columns
+        return plan_recipe_queryset(queryset, self.action, self._selected_fields())
 
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+    @conditional_response  # 304 when the client's copy is still current
+    @cached_response  # served from the per-user cache until the user writes something
+    def list(self, request, *args, **kwargs):
+        serializer = RecipeRowSerializer(
+            self.get_serializer_class(), self.get_serializer_context(), self._selected_fields(),
+        )
+        queryset = serializer.rows(self.filter_queryset(self.get_queryset()))  # dicts, no model instances
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(list(queryset)))
+
+    @conditional_response
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_serializer_class(self):
         """return serializer class for request."""
-        if self.action == 'list':  # action list is defined automatically by the view set
-            return serializers.RecipeSerializer
+        if self.action == 'list' and 'fields' not in self.request.query_params:  # list is defined by the view set
+            return serializers.RecipeSerializer  # ?fields= picks among all the detail fields, like image
         elif self.action == 'upload_image':  # custom action
             return serializers.RecipeImageSerializer
+        elif self.action == 'changes':
+            return serializers.RecipeChangesSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkOperationSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         """Create a new Recipe."""
         serializer.save(user=self.request.user)  # connect the recipe object to the auth user
+        invalidate_user_responses(self.request.user)
+
+    def perform_update(self, serializer):
+        """Update a Recipe."""
+        serializer.save()
+        invalidate_user_responses(self.request.user)
+
+    def perform_destroy(self, instance):
+        """Delete a Recipe."""
+        instance.delete()
+        invalidate_user_responses(self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')  # detail=true means the ID or PK of inst-endpoint
+    @action(methods=['POST'], detail=True, url_path='upload-image',  # detail=true means the ID or PK of inst-endpoint
+            parser_classes=[ImageUploadParser])  # limits checked while the upload streams
     def upload_image(self, request, pk=None):
         """upload an image to recipe"""
         recipe = self.get_object()  # uses pk to get instance of the request
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():  # the image stays referenced (and locked) while its file is written
+                serializer.save()
+                enqueue_variants(recipe)  # thumbnails are made by the process_images worker, or reused
+            invalidate_user_responses(request.user)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('size', OpenApiTypes.STR, description='Variant size, e.g. thumb, the original without'),
+            OpenApiParameter('format', OpenApiTypes.STR, description='Variant format, e.g. webp'),
+        ],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY, (206, 'image/*'): OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=True, url_path='image', content_negotiation_class=FileContentNegotiation)
+    def image_file(self, request, pk=None):
+        """Download the recipe's image or one of its variants, only for the owner"""
+        recipe = self.get_object()  # other users' recipes are not found
+        size = request.query_params.get('size')
+        if size:
+            name = recipe.image_variants.get(size, {}).get(request.query_params.get('format', 'jpeg'))
+        else:
+            name = recipe.image.name
+        if not name:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_image(request, name)  # the web server sends the bytes when MEDIA_SENDFILE is set
+
+    @extend_schema(
+        request=serializers.RecipeBulkOperationSerializer(many=True),
+        responses=serializers.RecipeBulkResultSerializer(many=True),
+    )
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create, update and delete many recipes in one transaction, all or nothing"""
+        if isinstance(request.data, list) and len(request.data) > MAX_OPERATIONS:  # before validating any of them
+            raise ValidationError({'detail': f'At most {MAX_OPERATIONS} operations per request.'})
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        results, applied = run_operations(request.user, serializer.validated_data, self.get_serializer_context())
+        if not applied:  # nothing was written, the results tell which operations failed
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+
+        invalidate_user_responses(request.user)
+        return Response(results, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'output',
+                OpenApiTypes.STR, enum=sorted(FORMATS),
+                description='ndjson (default) or csv, tags and ingredients filters apply as in the list',
+            )
+        ],
+        responses={(200, content_type): OpenApiTypes.BINARY for content_type, _ in FORMATS.values()},
+    )
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream the user's recipe book as NDJSON or CSV"""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in FORMATS:
+            raise ValidationError({'output': [f'Choose one of {", ".join(FORMATS)}.']})
+
+        content_type, extension = FORMATS[output]
+        rows = export_rows(output, self.get_queryset(), self.get_serializer_context())  # lazy, read while sent
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="recipes.{extension}"'
+        return response
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description='sync_token of the previous sync, leave it out for a full sync',
+        )
+    ])
+    @action(methods=['GET'], detail=False)  # detail=false works on the collection at changes/
+    def changes(self, request):
+        """Recipes, tags and ingredients changed or deleted since the last sync"""
+        try:
+            changes = collect_changes(request.user, request.query_params.get('since'))
+        except InvalidSyncToken:
+            raise ValidationError({'since': ['Invalid sync token.']})
+        except ExpiredSyncToken:  # tombstones are pruned, the client has to start over with a full sync
+            return Response({'detail': 'Sync token expired, do a full sync without since.'},
+                            status=status.HTTP_410_GONE)
+
+        serializer = self.get_serializer(changes)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -87,7 +287,12 @@ class RecipeViewsSet(viewsets.ModelViewSet):  # ModelViewSet works directly on a
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],  # enum gives integer option in the documentation
                 description='filter by item assigned to recipes.',
-            )
+            ),
+            OpenApiParameter(
+                'usage_count',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='add the number of recipes using each item.',
+            ),
         ]
     )
 )
@@ -95,28 +300,96 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin, mixins.ListModelMixin,
                             mixins.DestroyModelMixin, viewsets.GenericViewSet):
     """Base ViewSet for recipe attributes like Tags and Ingredients"""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
 
     def get_queryset(self):
         """filter queryset to objects related authenticated user."""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))  # zero is a default value
-        )
+        assigned_only = self._flag('assigned_only')
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(assigned(queryset.model))  # EXISTS, no join of every recipe to de-duplicate
+        if self._with_usage_count():
+            queryset = queryset.annotate(usage_count=usage_count(queryset.model))  # same query, one count per row
+
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    def _flag(self, param):
+        """A 0 or 1 query param as a bool, zero is the default value."""
+        value = self.request.query_params.get(param, '0')
+        if value not in ('0', '1'):
+            raise ValidationError({param: ['Use 0 or 1.']})
+        return value == '1'
+
+    def _with_usage_count(self):
+        return self.action == 'list' and self._flag('usage_count')
+
+    @conditional_response
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        if self.action == 'autocomplete':
+            return serializers.SuggestionSerializer
+        if self._with_usage_count():
+            return self.usage_serializer_class
+        return self.serializer_class
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('prefix', OpenApiTypes.STR, description='Start of the name, any case'),
+            OpenApiParameter('limit', OpenApiTypes.INT, description=f'Suggestions, at most {MAX_AUTOCOMPLETE_LIMIT}'),
+        ],
+        responses=serializers.SuggestionSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False, pagination_class=None)  # top suggestions only, no pages
+    @conditional_response
+    @cached_response  # asked on every keystroke, repeated prefixes cost nothing until the user writes
+    def autocomplete(self, request):
+        """Names starting with the prefix, the ones used in most of the user's recipes first"""
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        limit = min(max(limit, 1), MAX_AUTOCOMPLETE_LIMIT)
+
+        queryset = self.queryset.filter(user=request.user)
+        prefix = request.query_params.get('prefix', '').strip()
+        if prefix:  # a range scan of the (user, upper(name)) prefix index
+            queryset = queryset.filter(name__istartswith=prefix)
+        suggestions = (
+            queryset.annotate(usage_count=usage_count(self.queryset.model))
+            .order_by('-usage_count', 'name')
+            .values('id', 'name', 'usage_count')[:limit]
+        )
+        return Response(self.get_serializer(suggestions, many=True).data)
+
+    def perform_update(self, serializer):
+        """Reject renaming to a name the user already has, names are unique per user."""
+        try:
+            with transaction.atomic():  # the unique constraint decides, a check before the save would race
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': ['You already have an item with this name.']})
+        invalidate_user_responses(self.request.user)  # recipes nest tags and ingredients, so all of it is stale
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+    def perform_destroy(self, instance):
+        """Delete a tag or ingredient."""
+        instance.delete()
+        invalidate_user_responses(self.request.user)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage Tags in the database"""
     serializer_class = serializers.TagSerializer
+    usage_serializer_class = serializers.TagUsageSerializer
     queryset = Tag.objects.all()  # list model mixin will edit the behaviour of list query set
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database"""
     serializer_class = serializers.IngredientSerializer
+    usage_serializer_class = serializers.IngredientUsageSerializer
     queryset = Ingredient.objects.all()
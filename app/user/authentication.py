@@ -0,0 +1,48 @@
+"""
+Token authentication with a cached token -> user lookup
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.authentication import TokenScheme
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.caching import cache_is_shared
+
+
+def token_cache_key(key):
+    """Cache key of a token, hashed so the raw token never shows up in the cache backend"""
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    """Forget the cached user of a token."""
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user_tokens(user):
+    """Forget the cached tokens of a user, after it's updated or deactivated."""
+    cache.delete_many([token_cache_key(key) for key in Token.objects.filter(user=user).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in TokenAuthentication that skips the token + user query while the token is cached"""
+
+    def authenticate_credentials(self, key):
+        if not cache_is_shared():  # deleting the token or deactivating the user would miss the other workers
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is not None:
+            return token.user, token  # only active users are cached, deactivating them drops the entry
+
+        user, token = super().authenticate_credentials(key)  # raises for unknown tokens and inactive users
+        cache.set(cache_key, token, getattr(settings, 'TOKEN_CACHE_TTL', 300))  # token pickles with its user
+        return user, token
+
+
+class CachedTokenScheme(TokenScheme):
+    """Document CachedTokenAuthentication in the OpenAPI schema like TokenAuthentication"""
+    target_class = 'user.authentication.CachedTokenAuthentication'
@@ -0,0 +1,22 @@
+"""
+Signals keeping the cached token authentication in sync
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """A deleted token must stop authenticating right away."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    """Updated or deactivated users must not be served from the cache."""
+    if not created:  # new users have no token yet
+        invalidate_user_tokens(instance)
@@ -0,0 +1,87 @@
+"""
+Test for the cached token authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..authentication import token_cache_key
+
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(ALLOW_LOCAL_CACHE=True)  # the tests run in a single process
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        cache.clear()  # locmem cache lives across tests
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='test-pass123', name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test the token query runs only on the first request."""
+        self.client.get(ME_URL)
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+
+        with self.assertNumQueries(0):  # user comes from the cache, me/ needs no other query
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test unknown tokens are not authenticated."""
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        """Test a deleted token stops working although it was cached."""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_invalidates(self):
+        """Test updating the user through me/ refreshes the cached user."""
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'Updated Name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Updated Name')
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user is rejected although the token was cached."""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(ALLOW_LOCAL_CACHE=False)
+    def test_process_local_cache_not_used(self):
+        """Test tokens aren't cached where other workers couldn't drop them."""
+        self.client.get(ME_URL)
+
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
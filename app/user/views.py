@@ -1,9 +1,10 @@
 """
 USER API VIEWS
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from .authentication import CachedTokenAuthentication
 from .serializers import AuthTokenSerializer, UserSerializer
 
 
@@ -21,7 +22,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """manage the logged user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]  # chooses the mechanism of auth
+    authentication_classes = [CachedTokenAuthentication]  # chooses the mechanism of auth
     permission_classes = [permissions.IsAuthenticated]  # chooses the state of the user
 
     def get_object(self):